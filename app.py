@@ -33,22 +33,60 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 ================================================================================
 """
 
+import cProfile
+import gzip
+import hashlib
+import io
+import ipaddress
 import json
+import math
+import multiprocessing
 import os
+import pickle
+import queue
 import random
+import re
+import shutil
+import signal
+import tempfile
+import tracemalloc
+import unicodedata
+from collections import Counter, deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, CancelledError, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
+from types import SimpleNamespace
+from urllib.parse import quote, urlsplit
 from xml.etree import ElementTree
 from functools import wraps
 
 import requests
 import threading
 import time
-from flask import Flask, request, jsonify, send_file, session
+from flask import Flask, Response, redirect, request, jsonify, send_file, send_from_directory, session
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import case, func, inspect as sa_inspect
+from sqlalchemy.exc import SQLAlchemyError
 from werkzeug.security import generate_password_hash, check_password_hash
 from dotenv import load_dotenv
 
+try: import brotli  # 可选依赖，安装后首页额外提供 br 压缩版本
+except ImportError: brotli = None
+try:  # 可选依赖，STORAGE_BACKEND=s3 时需要
+    import boto3
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError: boto3 = None
+try: import orjson  # 可选依赖，安装后 JSON 解析与序列化改用 orjson
+except ImportError: orjson = None
+try: import fcntl  # Windows 没有 fcntl，此时每个进程各自预热
+except ImportError: fcntl = None
+try: import resource  # Windows 没有 resource，此时隔离进程不限制内存和 CPU 时间
+except ImportError: resource = None
+
 # 加载环境变量
 load_dotenv()
 
@@ -61,13 +99,155 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:/
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', 'files')
 app.config['FILE_EXPIRE_MINUTES'] = int(os.environ.get('FILE_EXPIRE_MINUTES', 20))
+# 同一作品已有未过期的结果且剩余有效期不少于 OUTPUT_REUSE_MIN_MINUTES 分钟时直接返回，不再重新反编译
+app.config['OUTPUT_REUSE'] = os.environ.get('OUTPUT_REUSE', 'true').lower() == 'true'
+app.config['OUTPUT_REUSE_MIN_MINUTES'] = int(os.environ.get('OUTPUT_REUSE_MIN_MINUTES', 3))
+# 热门作品预热：按近 WARM_WINDOW_HOURS 小时的请求数 + 下载数选出前 WARM_TOP_N 个作品，结果过期前 WARM_LEAD_MINUTES 分钟在后台重新反编译
+app.config['WARM_ENABLED'] = os.environ.get('WARM_ENABLED', 'false').lower() == 'true'
+app.config['WARM_TOP_N'] = int(os.environ.get('WARM_TOP_N', 20))
+app.config['WARM_WINDOW_HOURS'] = float(os.environ.get('WARM_WINDOW_HOURS', 24))
+app.config['WARM_LEAD_MINUTES'] = int(os.environ.get('WARM_LEAD_MINUTES', 8))  # 应大于 OUTPUT_REUSE_MIN_MINUTES + 检查间隔
+app.config['WARM_INTERVAL'] = float(os.environ.get('WARM_INTERVAL', 60))
+app.config['WARM_CONCURRENCY'] = int(os.environ.get('WARM_CONCURRENCY', 1))
+app.config['WARM_HOURLY_BUDGET'] = int(os.environ.get('WARM_HOURLY_BUDGET', 60))  # 每小时最多预热次数，限制对上游的额外请求
+app.config['WARM_UPSTREAM_SHARE'] = float(os.environ.get('WARM_UPSTREAM_SHARE', 0.5))  # 上游进行中请求达到并发上限的该比例时暂停预热
+app.config['WARM_LOCK_FILE'] = os.environ.get('WARM_LOCK_FILE', os.path.join('cache', 'warmer.lock'))
+# 输出文件配额（MB，0 表示不限）与磁盘最少剩余空间（MB），超出时按 OUTPUT_EVICTION_POLICY（oldest / least_downloaded）提前删除
+app.config['OUTPUT_QUOTA_MB'] = int(os.environ.get('OUTPUT_QUOTA_MB', 2048))
+app.config['OUTPUT_MIN_FREE_MB'] = int(os.environ.get('OUTPUT_MIN_FREE_MB', 0))
+app.config['OUTPUT_EVICTION_POLICY'] = os.environ.get('OUTPUT_EVICTION_POLICY', 'oldest')
+app.config['OUTPUT_ENFORCE_INTERVAL'] = float(os.environ.get('OUTPUT_ENFORCE_INTERVAL', 30))  # 反编译完成后每个 worker 至多每隔这么多秒检查一次配额
+# 输出文件存储后端：local 为 UPLOAD_FOLDER；s3 为 S3 兼容对象存储（多节点部署时使用，需安装 boto3）
+app.config['STORAGE_BACKEND'] = os.environ.get('STORAGE_BACKEND', 'local').lower()
+app.config['S3_BUCKET'] = os.environ.get('S3_BUCKET', '')
+app.config['S3_PREFIX'] = os.environ.get('S3_PREFIX', 'outputs/')
+app.config['S3_ENDPOINT_URL'] = os.environ.get('S3_ENDPOINT_URL') or None  # MinIO 等自建服务的地址
+app.config['S3_REGION'] = os.environ.get('S3_REGION') or None
+app.config['S3_ACCESS_KEY_ID'] = os.environ.get('S3_ACCESS_KEY_ID') or None
+app.config['S3_SECRET_ACCESS_KEY'] = os.environ.get('S3_SECRET_ACCESS_KEY') or None
+app.config['S3_PRESIGN'] = os.environ.get('S3_PRESIGN', 'true').lower() == 'true'  # false 时由本服务转发文件内容
+app.config['S3_PRESIGN_EXPIRES'] = int(os.environ.get('S3_PRESIGN_EXPIRES', 300))
 app.config['ADMIN_USERNAME'] = os.environ.get('ADMIN_USERNAME', 'admin')
 app.config['ADMIN_PASSWORD'] = os.environ.get('ADMIN_PASSWORD', 'admin123')
+# 上游接口地址（压测时可指向 tools/mock_codemao.py）
+app.config['CODEMAO_API_BASE'] = os.environ.get('CODEMAO_API_BASE', 'https://api.codemao.cn').rstrip('/')
+app.config['CODEMAO_CREATION_BASE'] = os.environ.get('CODEMAO_CREATION_BASE', 'https://api-creation.codemao.cn').rstrip('/')
+# 采样性能分析（默认关闭，可在后台调整）
+app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+app.config['PROFILE_WORK_IDS'] = os.environ.get('PROFILE_WORK_IDS', '')
+app.config['PROFILE_MEMORY'] = os.environ.get('PROFILE_MEMORY', 'true').lower() == 'true'
+app.config['PROFILE_FOLDER'] = os.environ.get('PROFILE_FOLDER', 'profiles')
+app.config['PROFILE_MAX_FILES'] = int(os.environ.get('PROFILE_MAX_FILES', 50))
+# 大型 Kitten 作品按角色多进程反编译（0 表示关闭）
+app.config['PARALLEL_ACTOR_WORKERS'] = int(os.environ.get('PARALLEL_ACTOR_WORKERS', 0))
+app.config['PARALLEL_ACTOR_MIN'] = int(os.environ.get('PARALLEL_ACTOR_MIN', 64))
+# 在常驻子进程中解析、反编译并序列化作品（0 表示关闭），大作品占用的内存随子进程回收，不会留在 gunicorn worker 中
+app.config['ISOLATED_WORKERS'] = int(os.environ.get('ISOLATED_WORKERS', 0))
+app.config['ISOLATED_MEMORY_MB'] = int(os.environ.get('ISOLATED_MEMORY_MB', 2048))  # 每个任务可额外使用的地址空间，0 表示不限
+app.config['ISOLATED_CPU_SECONDS'] = int(os.environ.get('ISOLATED_CPU_SECONDS', 60))  # 每个任务的 CPU 时间上限，0 表示不限
+app.config['ISOLATED_MAX_TASKS'] = int(os.environ.get('ISOLATED_MAX_TASKS', 100))  # 子进程处理该数量的任务后重建
+app.config['ISOLATED_RECYCLE_MB'] = int(os.environ.get('ISOLATED_RECYCLE_MB', 512))  # 任务结束后子进程内存占用超过该值时重建
+# 按角色缓存反编译结果（MB，0 表示关闭）：作品更新后只重新反编译有变化的角色
+app.config['ACTOR_CACHE_FOLDER'] = os.environ.get('ACTOR_CACHE_FOLDER', os.path.join('cache', 'actors'))
+app.config['ACTOR_CACHE_MAX_MB'] = int(os.environ.get('ACTOR_CACHE_MAX_MB', 0))
+# 上游作品信息 / 编译文件地址缓存（秒，0 表示不缓存）
+app.config['CACHE_INFO_TTL'] = int(os.environ.get('CACHE_INFO_TTL', 300))
+app.config['CACHE_URL_TTL'] = int(os.environ.get('CACHE_URL_TTL', 120))
+app.config['CACHE_NEGATIVE_TTL'] = int(os.environ.get('CACHE_NEGATIVE_TTL', 60))  # 不存在 / 不支持的作品，期间直接拒绝，不再请求上游
+app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+# 编译文件磁盘缓存（MB，0 表示关闭）
+app.config['PAYLOAD_CACHE_FOLDER'] = os.environ.get('PAYLOAD_CACHE_FOLDER', os.path.join('cache', 'payloads'))
+app.config['PAYLOAD_CACHE_MAX_MB'] = int(os.environ.get('PAYLOAD_CACHE_MAX_MB', 1024))
+app.config['PAYLOAD_CACHE_TTL'] = int(os.environ.get('PAYLOAD_CACHE_TTL', 86400))  # 超过后用 ETag/Last-Modified 向上游重新验证
+# 查询作品信息的同时预先请求 Kitten 编译文件地址，省去一次往返
+app.config['SPECULATIVE_KITTEN_LOAD'] = os.environ.get('SPECULATIVE_KITTEN_LOAD', 'false').lower() == 'true'
+# 上游并发上限（每个 worker）与熔断器
+app.config['UPSTREAM_MAX_CONCURRENCY'] = int(os.environ.get('UPSTREAM_MAX_CONCURRENCY', 16))
+app.config['UPSTREAM_QUEUE_TIMEOUT'] = float(os.environ.get('UPSTREAM_QUEUE_TIMEOUT', 5))
+app.config['CIRCUIT_FAILURE_THRESHOLD'] = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))
+app.config['CIRCUIT_COOLDOWN'] = float(os.environ.get('CIRCUIT_COOLDOWN', 30))
+# 对冲请求：上游在该主机近期延迟的 HEDGE_PERCENTILE 分位内未响应时再发一个相同请求，先返回者生效
+app.config['HEDGE_ENABLED'] = os.environ.get('HEDGE_ENABLED', 'false').lower() == 'true'
+app.config['HEDGE_PERCENTILE'] = float(os.environ.get('HEDGE_PERCENTILE', 95))
+app.config['HEDGE_MIN_SAMPLES'] = int(os.environ.get('HEDGE_MIN_SAMPLES', 20))
+app.config['HEDGE_MIN_DELAY_MS'] = float(os.environ.get('HEDGE_MIN_DELAY_MS', 50))
+app.config['HEDGE_MAX_RATIO'] = float(os.environ.get('HEDGE_MAX_RATIO', 0.05))  # 对冲请求数占上游请求数的上限
+# 下载交给反向代理发送：'nginx' 使用 X-Accel-Redirect（需配置 internal location），'sendfile' 使用 X-Sendfile；留空由 Flask 直接发送
+app.config['DOWNLOAD_ACCEL'] = os.environ.get('DOWNLOAD_ACCEL', '').lower()
+app.config['DOWNLOAD_ACCEL_PREFIX'] = os.environ.get('DOWNLOAD_ACCEL_PREFIX', '/protected-files/')
+# 单次反编译的总时间预算（秒），需小于 gunicorn 的 --timeout
+app.config['DECOMPILE_DEADLINE'] = float(os.environ.get('DECOMPILE_DEADLINE', 100))
+# 单机反编译并发上限（所有 worker 合计，0 表示不限）：超出的请求在有界队列中等待，队列已满或等待超时返回 503 + Retry-After
+app.config['ADMISSION_MAX_CONCURRENT'] = int(os.environ.get('ADMISSION_MAX_CONCURRENT', 0))
+app.config['ADMISSION_QUEUE_SIZE'] = int(os.environ.get('ADMISSION_QUEUE_SIZE', 16))
+app.config['ADMISSION_QUEUE_TIMEOUT'] = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 30))
+app.config['ADMISSION_RESERVED'] = int(os.environ.get('ADMISSION_RESERVED', 1))  # 只给后台管理员请求使用的槽位数
+app.config['ADMISSION_LOCK_DIR'] = os.environ.get('ADMISSION_LOCK_DIR', os.path.join('cache', 'admission'))
+# JSON 实现：auto（安装了 orjson 时使用）/ orjson / stdlib
+app.config['JSON_BACKEND'] = os.environ.get('JSON_BACKEND', 'auto').lower()
 
 db = SQLAlchemy(app)
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 
+# ==================== JSON ====================
+
+# orjson 与标准库输出不同的只有浮点数的科学计数法（1e-05 / 1e-5、1e+16 / 1e16）和极小小数（1e-05 / 0.00001），出现这类数字时改用标准库。
+# 逐字节跑正则太慢：先把数字映射成 0、数值前的 [ , 映射成 :、其余字符映射成 x 并删去空白，只需在 ':' 之后匹配数值
+def _byte_table(mapping): return bytes(mapping.get(i, ord('x')) for i in range(256))
+FLOAT_SCAN_TABLE = _byte_table({**{c: ord('0') for c in b'0123456789'}, **{c: ord(':') for c in b':[,'}, ord('e'): ord('e'), ord('.'): ord('.'), ord('-'): ord('-')})
+RISKY_FLOAT_RE = re.compile(rb':-?0+(?:\.0+)?e|:-?0\.0000')
+# orjson 把超出 64 位的整数解析成浮点数，输入中有连续 19 位以上数字时改用标准库
+DIGIT_SCAN_TABLE = _byte_table({c: ord('0') for c in b'0123456789'})
+
+def use_orjson(): return orjson is not None and app.config['JSON_BACKEND'] != 'stdlib'
+
+class NonFiniteFloat(float):
+    """标准库解析出的 NaN / ±Infinity（含 1e400 这类溢出的数）。orjson 会把它们写成 null，
+    而它不支持 float 子类，序列化时遇到就会改用标准库，输出 NaN / Infinity"""
+    __slots__ = ()
+
+def _parse_float(t): f = float(t); return f if math.isfinite(f) else NonFiniteFloat(f)
+
+def json_loads(s):
+    """解析 JSON（str 或 bytes）；orjson 不接受或会解析得不同的输入（NaN、超过 64 位的整数等）交给标准库"""
+    if not use_orjson(): return json.loads(s)
+    if b'0' * 19 not in (s if isinstance(s, bytes) else s.encode('utf-8')).translate(DIGIT_SCAN_TABLE):
+        try: return orjson.loads(s)
+        except orjson.JSONDecodeError: metrics.inc('json_fallback')
+    return json.loads(s, parse_float=_parse_float, parse_constant=NonFiniteFloat)
+
+def json_dumps_bytes(obj, ensure_ascii=False, indent=None, separators=None, sort_keys=False, default=None):
+    """返回 UTF-8 字节，与 json.dumps(...).encode('utf-8') 逐字节一致；参数组合 orjson 无法等价实现时使用标准库"""
+    compact = separators == (',', ':') if indent is None else separators in (None, (',', ': '))
+    if use_orjson() and not ensure_ascii and indent in (None, 2) and compact:
+        try:
+            b = orjson.dumps(obj, default=default, option=(orjson.OPT_INDENT_2 if indent else 0) | (orjson.OPT_SORT_KEYS if sort_keys else 0) | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+            if not RISKY_FLOAT_RE.search(b.translate(FLOAT_SCAN_TABLE, b' \n\r\t')): return b
+        except orjson.JSONEncodeError: pass  # 非字符串键、超大整数、NonFiniteFloat 等；default 本身出错时标准库会抛出同样的异常
+        metrics.inc('json_fallback')
+    return json.dumps(obj, ensure_ascii=ensure_ascii, indent=indent, separators=separators, sort_keys=sort_keys, default=default).encode('utf-8')
+
+def json_dumps(obj, **kw): return json_dumps_bytes(obj, **kw).decode('utf-8')
+
+def json_dump(obj, f, **kw):
+    """写入文本文件；有底层二进制缓冲时直接写字节，省去一次解码"""
+    b = json_dumps_bytes(obj, **kw)
+    if hasattr(f, 'buffer'): f.flush(); f.buffer.write(b)
+    else: f.write(b.decode('utf-8'))
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """API 请求体与响应同样使用 json_loads / json_dumps；响应直接输出中文（ensure_ascii=False）"""
+    ensure_ascii = False
+    def dumps(self, obj, **kw):
+        kw.setdefault('default', self.default); kw.setdefault('ensure_ascii', self.ensure_ascii); kw.setdefault('sort_keys', self.sort_keys)
+        return json_dumps(obj, **kw)
+    def loads(self, s, **kw): return json_loads(s) if not kw else json.loads(s, **kw)
+
+app.json = FastJSONProvider(app)
+
+
 # ==================== HTML模板 ====================
 
 INDEX_HTML = '''<!DOCTYPE html>
@@ -788,6 +968,11 @@ ADMIN_HTML = '''<!DOCTYPE html>
                         <i class="bi bi-shield-slash"></i> 黑名单管理
                     </a>
                 </li>
+                <li class="nav-item">
+                    <a href="#" class="nav-link" id="navOps" onclick="switchTab('ops')">
+                        <i class="bi bi-speedometer2"></i> 运行状态
+                    </a>
+                </li>
                 <li class="nav-item">
                     <a href="#" class="nav-link" data-bs-toggle="modal" data-bs-target="#modalChangePassword">
                         <i class="bi bi-key"></i> 修改密码
@@ -821,7 +1006,7 @@ ADMIN_HTML = '''<!DOCTYPE html>
             <!-- Dashboard View -->
             <div id="viewDashboard" class="fade-in">
                 <div class="d-flex justify-content-between align-items-center mb-4">
-                    <h4 class="fw-bold mb-0">系统概览</h4>
+                    <h4 class="fw-bold mb-0">系统概览 <small class="text-muted fw-normal fs-6" id="statStorage"></small></h4>
                     <button class="btn btn-light border bg-white text-muted btn-sm" onclick="loadStats();loadRecords();"><i class="bi bi-arrow-clockwise me-1"></i> 刷新数据</button>
                 </div>
                 
@@ -861,7 +1046,8 @@ ADMIN_HTML = '''<!DOCTYPE html>
                         <h6 class="fw-bold mb-0">最近反编译活动</h6>
                         <div class="input-group input-group-sm" style="width: 200px;">
                             <span class="input-group-text bg-light border-end-0"><i class="bi bi-search"></i></span>
-                            <input type="text" class="form-control bg-light border-start-0" placeholder="搜索ID..." id="searchRecord">
+                            <input type="text" class="form-control bg-light border-start-0" placeholder="作品名 / 作者 / IP / ID" id="searchRecord">
+                            <button class="btn btn-outline-danger" id="bulkDelRecords" title="删除所有匹配的记录"><i class="bi bi-trash"></i></button>
                         </div>
                     </div>
                     <div class="table-responsive">
@@ -888,6 +1074,10 @@ ADMIN_HTML = '''<!DOCTYPE html>
             <div id="viewBanned" style="display:none;" class="fade-in">
                 <div class="d-flex justify-content-between align-items-center mb-4">
                     <h4 class="fw-bold mb-0">黑名单管理</h4>
+                    <div>
+                        <input type="file" id="inputImportBans" accept=".txt,.csv" class="d-none">
+                        <button class="btn btn-light border bg-white text-muted btn-sm" onclick="document.getElementById('inputImportBans').click();" title="每行一个作品ID或IP，可在逗号后写原因"><i class="bi bi-upload me-1"></i> 导入封禁列表</button>
+                    </div>
                 </div>
                 
                 <div class="row g-4">
@@ -921,6 +1111,82 @@ ADMIN_HTML = '''<!DOCTYPE html>
                     </div>
                 </div>
             </div>
+
+            <!-- Ops View -->
+            <div id="viewOps" style="display:none;" class="fade-in">
+                <div class="d-flex justify-content-between align-items-center mb-4">
+                    <h4 class="fw-bold mb-0">运行状态</h4>
+                    <button class="btn btn-light border bg-white text-muted btn-sm" onclick="loadOps();"><i class="bi bi-arrow-clockwise me-1"></i> 刷新数据</button>
+                </div>
+
+                <div class="content-card mb-4">
+                    <div class="content-header">
+                        <h6 class="fw-bold mb-0"><i class="bi bi-diagram-3 me-2"></i>上游状态 <small class="text-muted fw-normal" id="upstreamInfo"></small></h6>
+                        <small class="text-muted" id="admissionInfo"></small>
+                    </div>
+                    <div class="table-responsive">
+                        <table class="table table-hover align-middle mb-0">
+                            <thead><tr><th class="ps-4">主机</th><th>熔断状态</th><th>连续失败</th><th>对冲延迟</th><th class="pe-4">断开时间</th></tr></thead>
+                            <tbody id="upstreamList"></tbody>
+                        </table>
+                    </div>
+                </div>
+
+                <div class="content-card mb-4">
+                    <div class="content-header">
+                        <h6 class="fw-bold mb-0"><i class="bi bi-fire me-2"></i>热门作品预热 <small class="text-muted fw-normal" id="warmerInfo"></small></h6>
+                    </div>
+                    <div class="table-responsive">
+                        <table class="table table-hover align-middle mb-0">
+                            <thead><tr><th class="ps-4">作品</th><th>请求 / 下载</th><th>当前结果</th><th class="pe-4">状态</th></tr></thead>
+                            <tbody id="warmerList"></tbody>
+                        </table>
+                    </div>
+                </div>
+
+                <div class="content-card mb-4">
+                    <div class="content-header">
+                        <h6 class="fw-bold mb-0"><i class="bi bi-speedometer2 me-2"></i>慢作品分析 <small class="text-muted fw-normal">(近 24 小时)</small></h6>
+                    </div>
+                    <div class="table-responsive">
+                        <table class="table table-hover align-middle mb-0">
+                            <thead><tr><th class="ps-4">作品类型</th><th>次数</th><th>耗时 p50 / p95 / p99</th><th>编译文件 p95</th><th class="pe-4">内存增长 p95</th></tr></thead>
+                            <tbody id="analyticsTypes"></tbody>
+                        </table>
+                    </div>
+                    <div class="table-responsive border-top">
+                        <table class="table table-hover align-middle mb-0">
+                            <thead><tr><th class="ps-4">最慢作品</th><th>耗时</th><th>各阶段 (ms)</th><th>编译文件</th><th class="pe-4">积木 / 角色</th></tr></thead>
+                            <tbody id="analyticsSlowest"></tbody>
+                        </table>
+                    </div>
+                </div>
+
+                <div class="content-card mb-4">
+                    <div class="content-header">
+                        <h6 class="fw-bold mb-0"><i class="bi bi-bar-chart me-2"></i>运行指标 <small class="text-muted fw-normal" id="metricsPid"></small></h6>
+                        <button class="btn btn-sm btn-outline-danger" id="purgeCache"><i class="bi bi-eraser"></i> 清空上游缓存</button>
+                    </div>
+                    <div class="p-4"><div class="row g-2 small" id="metricsList"></div></div>
+                </div>
+
+                <div class="content-card mb-4">
+                    <div class="content-header">
+                        <h6 class="fw-bold mb-0"><i class="bi bi-activity me-2"></i>采样性能分析</h6>
+                        <div class="d-flex gap-2 align-items-center">
+                            <input type="number" step="0.01" min="0" max="1" class="form-control form-control-sm bg-light" style="width: 100px;" id="inputProfileRate" title="采样比例 (0~1)">
+                            <input type="text" class="form-control form-control-sm bg-light" style="width: 200px;" id="inputProfileWorks" placeholder="指定作品ID，逗号分隔">
+                            <button class="btn btn-sm btn-primary" id="saveProfiler">保存</button>
+                        </div>
+                    </div>
+                    <div class="table-responsive">
+                        <table class="table table-hover align-middle mb-0">
+                            <thead><tr><th class="ps-4">文件</th><th>大小</th><th>时间</th><th class="text-end pe-4">操作</th></tr></thead>
+                            <tbody id="profileFiles"></tbody>
+                        </table>
+                    </div>
+                </div>
+            </div>
         </div>
     </div>
 
@@ -1080,14 +1346,17 @@ ADMIN_HTML = '''<!DOCTYPE html>
                 // UI Toggles
                 document.getElementById('viewDashboard').style.display = tab === 'dashboard' ? 'block' : 'none';
                 document.getElementById('viewBanned').style.display = tab === 'banned' ? 'block' : 'none';
+                document.getElementById('viewOps').style.display = tab === 'ops' ? 'block' : 'none';
                 
                 // Nav Active States
                 document.getElementById('navDashboard').classList.toggle('active', tab === 'dashboard');
                 document.getElementById('navBanned').classList.toggle('active', tab === 'banned');
+                document.getElementById('navOps').classList.toggle('active', tab === 'ops');
                 
                 // Load Data
                 if (tab === 'banned') { loadBannedWorks(); loadBannedIps(); }
                 if (tab === 'dashboard') { loadStats(); loadRecords(); }
+                if (tab === 'ops') { loadOps(); }
             }
 
             // Data Loading
@@ -1098,11 +1367,14 @@ ADMIN_HTML = '''<!DOCTYPE html>
                     document.getElementById('statSuccess').textContent = res.data.success_records;
                     document.getElementById('statToday').textContent = res.data.today_records;
                     document.getElementById('statBanned').textContent = res.data.banned_works + res.data.banned_ips;
+                    const o = res.data.output_storage, mb = b => (b / 1048576).toFixed(1);
+                    document.getElementById('statStorage').textContent = `输出文件 (${o.backend}) ${o.files} 个，${mb(o.bytes)}${o.quota_bytes ? ' / ' + mb(o.quota_bytes) : ''} MB${o.disk_free_bytes != null ? '，磁盘剩余 ' + mb(o.disk_free_bytes) + ' MB' : ''}`;
                 }
             }
 
             async function loadRecords() {
-                const res = await api('/api/admin/records?per_page=50');
+                const q = document.getElementById('searchRecord').value.trim();
+                const res = await api('/api/admin/records?per_page=50' + (q ? '&q=' + encodeURIComponent(q) : ''));
                 if (res.success) {
                     const html = res.data.records.length ? res.data.records.map(r => `
                         <tr>
@@ -1118,8 +1390,8 @@ ADMIN_HTML = '''<!DOCTYPE html>
                                 </div>
                             </td>
                             <td>
-                                <span class="badge-custom ${r.status==='success'?'badge-success':'badge-danger'}">
-                                    ${r.status==='success' ? '<i class="bi bi-check-circle me-1"></i>成功' : '<i class="bi bi-x-circle me-1"></i>失败'}
+                                <span class="badge-custom ${r.status==='success'||r.status==='cached'?'badge-success':'badge-danger'}">
+                                    ${r.status==='success' ? '<i class="bi bi-check-circle me-1"></i>成功' : r.status==='cached' ? '<i class="bi bi-recycle me-1"></i>复用' : r.status==='timeout' ? '<i class="bi bi-hourglass-bottom me-1"></i>超时' : '<i class="bi bi-x-circle me-1"></i>失败'}
                                 </span>
                             </td>
                             <td><small class="text-muted">${new Date(r.created_at).toLocaleString()}</small></td>
@@ -1173,6 +1445,99 @@ ADMIN_HTML = '''<!DOCTYPE html>
                 }
             }
 
+            window.loadOps = async function() {
+                const u = await api('/api/admin/upstream');
+                if (u.success) {
+                    const badge = {closed: 'badge-success', half_open: 'badge-danger', open: 'badge-danger'};
+                    document.getElementById('upstreamInfo').textContent = `(worker ${u.data.pid}，进行中 ${u.data.in_flight}/${u.data.limit}${u.data.hedge_enabled ? '，对冲令牌 ' + u.data.hedge_tokens : ''})`;
+                    document.getElementById('upstreamList').innerHTML = u.data.breakers.length ? u.data.breakers.map(b => `
+                        <tr>
+                            <td class="ps-4"><code>${b.host}</code></td>
+                            <td><span class="badge-custom ${badge[b.state]}">${b.state}</span></td>
+                            <td>${b.failures}</td>
+                            <td>${b.hedge_delay_ms != null ? b.hedge_delay_ms + ' ms' : '-'}</td>
+                            <td class="pe-4"><small class="text-muted">${b.opened_at ? new Date(b.opened_at + 'Z').toLocaleString() : '-'}</small></td>
+                        </tr>
+                    `).join('') : '<tr><td colspan="5" class="text-center py-4 text-muted">暂无上游请求</td></tr>';
+                }
+                const ad = await api('/api/admin/admission');
+                if (ad.success) {
+                    const x = ad.data;
+                    document.getElementById('admissionInfo').textContent = x.enabled ? `准入控制：反编译中 ${x.active}/${x.limit}，排队 ${x.queued}/${x.queue_size}，等待 p50 ${x.wait_ms.p50 ?? '-'} ms / p95 ${x.wait_ms.p95 ?? '-'} ms (worker ${x.pid})` : '准入控制：未开启';
+                }
+                const w = await api('/api/admin/warmer');
+                if (w.success) {
+                    const d = w.data;
+                    document.getElementById('warmerInfo').textContent = d.enabled ? `(负责 worker ${d.leader_pid || d.pid}，本小时已预热 ${d.budget.used}/${d.budget.hourly}${d.last_run ? '，上次检查 ' + new Date(d.last_run + 'Z').toLocaleTimeString() : ''})` : '(未开启，以下为候选作品)';
+                    const state = x => x.running ? '<span class="badge-custom badge-warning">预热中</span>' : x.backoff ? '<span class="badge-custom badge-danger">失败，稍后重试</span>' : x.due ? '<span class="badge-custom badge-warning">待预热</span>' : `<span class="badge-custom badge-success">${x.warmed ? '已预热' : '有效'}</span>`;
+                    document.getElementById('warmerList').innerHTML = d.works.length ? d.works.map(x => `
+                        <tr>
+                            <td class="ps-4"><div class="fw-bold text-dark">${x.work_name||'未知作品'}</div><div class="small text-muted"><i class="bi bi-hash"></i> ${x.work_id}</div></td>
+                            <td>${x.requests} / ${x.downloads}</td>
+                            <td><small class="text-muted">${x.record_id ? '#' + x.record_id + '，' + new Date(x.expires_at + 'Z').toLocaleString() + ' 过期' : '-'}</small></td>
+                            <td class="pe-4">${state(x)}</td>
+                        </tr>
+                    `).join('') : '<tr><td colspan="4" class="text-center py-4 text-muted">暂无热门作品</td></tr>';
+                }
+                const a = await api('/api/admin/analytics?limit=5');
+                if (a.success) {
+                    const kb = v => v == null ? '-' : (v / 1024).toFixed(1) + ' KB', ms = v => v == null ? '-' : v + ' ms';
+                    document.getElementById('analyticsTypes').innerHTML = Object.keys(a.data.by_type).length ? Object.entries(a.data.by_type).map(([t, x]) => `
+                        <tr>
+                            <td class="ps-4"><span class="badge-custom badge-success">${t}</span></td>
+                            <td>${x.count}${x.failed ? ' <small class="text-danger">(失败 ' + x.failed + ')</small>' : ''}</td>
+                            <td>${ms(x.duration_ms.p50)} / ${ms(x.duration_ms.p95)} / ${ms(x.duration_ms.p99)}</td>
+                            <td>${kb(x.payload_bytes.p95)}</td>
+                            <td class="pe-4">${x.mem_peak_kb.p95 == null ? '-' : x.mem_peak_kb.p95 + ' KB'}</td>
+                        </tr>
+                    `).join('') : '<tr><td colspan="5" class="text-center py-4 text-muted">暂无数据</td></tr>';
+                    document.getElementById('analyticsSlowest').innerHTML = a.data.slowest.map(x => `
+                        <tr>
+                            <td class="ps-4"><div class="fw-bold text-dark">${x.work_name||'未知作品'}</div><div class="small text-muted"><i class="bi bi-hash"></i> ${x.work_id} · ${x.work_type||'-'}</div></td>
+                            <td>${ms(x.duration_ms)}</td>
+                            <td><small class="text-muted">${Object.entries(x.phase_ms).map(([k, v]) => k + ' ' + Math.round(v)).join(' · ')}</small></td>
+                            <td>${kb(x.payload_bytes)}</td>
+                            <td class="pe-4">${x.block_count ?? '-'} / ${x.actor_count ?? '-'}</td>
+                        </tr>
+                    `).join('');
+                }
+                const m = await api('/api/admin/metrics');
+                if (m.success) {
+                    document.getElementById('metricsPid').textContent = `(worker ${m.data.pid})`;
+                    const items = Object.entries({...m.data.counters, ...Object.fromEntries(Object.entries(m.data.cache_entries).map(([k, v]) => [`cache_${k}_entries`, v])), payload_cache_files: m.data.payload_cache.files, payload_cache_mb: (m.data.payload_cache.bytes / 1048576).toFixed(1), actor_cache_files: m.data.actor_cache.files, actor_cache_mb: (m.data.actor_cache.bytes / 1048576).toFixed(1), actor_cache_hit_rate: m.data.actor_cache.hit_rate == null ? '-' : (m.data.actor_cache.hit_rate * 100).toFixed(1) + '%'}).sort();
+                    document.getElementById('metricsList').innerHTML = items.length ? items.map(([k, v]) => `<div class="col-md-4"><code>${k}</code>: <b>${v}</b></div>`).join('') : '<div class="text-muted">暂无数据</div>';
+                }
+                const res = await api('/api/admin/profiler');
+                if (res.success) {
+                    document.getElementById('inputProfileRate').value = res.data.settings.sample_rate;
+                    document.getElementById('inputProfileWorks').value = res.data.settings.work_ids.join(',');
+                    const html = res.data.files.length ? res.data.files.map(f => `
+                        <tr>
+                            <td class="ps-4"><code>${f.name}</code></td>
+                            <td><small class="text-muted">${(f.size / 1024).toFixed(1)} KB</small></td>
+                            <td><small class="text-muted">${new Date(f.created_at + 'Z').toLocaleString()}</small></td>
+                            <td class="text-end pe-4">
+                                <a class="btn btn-sm btn-outline-primary border-0 rounded-circle" href="/api/admin/profiler/files/${encodeURIComponent(f.name)}" title="下载"><i class="bi bi-download"></i></a>
+                            </td>
+                        </tr>
+                    `).join('') : '<tr><td colspan="4" class="text-center py-4 text-muted">暂无分析结果</td></tr>';
+                    document.getElementById('profileFiles').innerHTML = html;
+                }
+            }
+
+            async function saveProfiler() {
+                const rate = parseFloat(document.getElementById('inputProfileRate').value) || 0;
+                const works = document.getElementById('inputProfileWorks').value.split(',').map(x => parseInt(x)).filter(x => x > 0);
+                await api('/api/admin/profiler', {method:'POST', body:{sample_rate:rate, work_ids:works}});
+                loadOps();
+            }
+
+            async function purgeCache() {
+                if (!confirm('确定清空上游作品信息缓存吗？')) return;
+                await api('/api/admin/cache', {method:'DELETE'});
+                loadOps();
+            }
+
             // Action Functions
             async function delRecord(id) { 
                 if (confirm('确定要删除这条记录吗？')) { 
@@ -1212,6 +1577,26 @@ ADMIN_HTML = '''<!DOCTYPE html>
                 loadStats();
             }
 
+            async function importBans(e) {
+                const file = e.target.files[0];
+                if (!file) return;
+                const form = new FormData(); form.append('file', file); e.target.value = '';
+                const res = await (await fetch('/api/admin/bans/import', {method: 'POST', body: form})).json();
+                if (!res.success) return alert(res.error);
+                alert('导入完成: ' + Object.entries(res.data.summary).map(([k, v]) => `${k} ${v}`).join('，'));
+                loadBannedWorks(); loadBannedIps(); loadStats();
+            }
+
+            async function bulkDelRecords() {
+                const q = document.getElementById('searchRecord').value.trim();
+                if (!q) return alert('请先输入搜索条件');
+                if (!confirm(`确定删除所有匹配「${q}」的记录及其文件吗？`)) return;
+                const res = await api('/api/admin/records/bulk-delete', {method:'POST', body:{q}});
+                if (!res.success) return alert(res.error);
+                alert(`已删除 ${res.data.results.length} 条记录` + (res.data.remaining ? `，还有 ${res.data.remaining} 条，请再次执行` : ''));
+                loadRecords(); loadStats();
+            }
+
             async function delBannedWork(id) { 
                 await api('/api/admin/banned-works/'+id, {method:'DELETE'}); 
                 loadBannedWorks(); loadStats(); 
@@ -1277,6 +1662,12 @@ ADMIN_HTML = '''<!DOCTYPE html>
                 document.getElementById('confirmBanWork')?.addEventListener('click', handleBanWork);
                 document.getElementById('confirmBanIp')?.addEventListener('click', handleBanIp);
                 document.getElementById('confirmChangePassword')?.addEventListener('click', handleChangePassword);
+                document.getElementById('saveProfiler')?.addEventListener('click', saveProfiler);
+                document.getElementById('purgeCache')?.addEventListener('click', purgeCache);
+                document.getElementById('inputImportBans')?.addEventListener('change', importBans);
+                document.getElementById('bulkDelRecords')?.addEventListener('click', bulkDelRecords);
+                let searchTimer;
+                document.getElementById('searchRecord')?.addEventListener('input', () => { clearTimeout(searchTimer); searchTimer = setTimeout(loadRecords, 300); });
 
                 // Event Delegation for Dynamic Elements
                 document.addEventListener('click', (e) => {
@@ -1299,6 +1690,26 @@ ADMIN_HTML = '''<!DOCTYPE html>
 </html>'''
 
 
+class StaticPage:
+    """启动时预先计算 ETag 和 gzip/br 压缩版本的静态页面"""
+    def __init__(self, html, cache_control):
+        raw = html.encode('utf-8'); tag = hashlib.sha256(raw).hexdigest()[:32]
+        self.cache_control, self.variants = cache_control, {'identity': (raw, tag), 'gzip': (gzip.compress(raw, 9, mtime=0), f"{tag}-gz")}
+        if brotli: self.variants['br'] = (brotli.compress(raw, quality=11), f"{tag}-br")
+
+    def response(self):
+        enc = next((e for e in ('br', 'gzip') if e in self.variants and request.accept_encodings[e]), 'identity')
+        body, tag = self.variants[enc]
+        resp = Response(status=304) if request.if_none_match.contains(tag) else Response(body, mimetype='text/html')
+        resp.set_etag(tag); resp.headers['Cache-Control'] = self.cache_control; resp.vary.add('Accept-Encoding')
+        if enc != 'identity' and resp.status_code == 200: resp.headers['Content-Encoding'] = enc
+        return resp
+
+# HTML 内联在代码中，随部署变化，只允许缓存后用 ETag 重新验证
+INDEX_PAGE = StaticPage(INDEX_HTML, 'public, no-cache')
+ADMIN_PAGE = StaticPage(ADMIN_HTML, 'private, no-cache')
+
+
 # ==================== 数据库模型 ====================
 
 class DecompilerRecord(db.Model):
@@ -1316,6 +1727,13 @@ class DecompilerRecord(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     expires_at = db.Column(db.DateTime, index=True)
     download_count = db.Column(db.Integer, default=0)
+    # 性能数据：总耗时、各阶段耗时（JSON）、编译文件大小、积木 / 角色数、反编译期间进程内存峰值的增长
+    duration_ms = db.Column(db.Integer)
+    phase_ms = db.Column(db.Text)
+    payload_bytes = db.Column(db.Integer)
+    block_count = db.Column(db.Integer)
+    actor_count = db.Column(db.Integer)
+    mem_peak_kb = db.Column(db.Integer)
 
     def to_dict(self):
         return {'id': self.id, 'work_id': self.work_id, 'work_name': self.work_name, 'work_type': self.work_type, 'author_name': self.author_name, 'file_size': self.file_size, 'status': self.status, 'created_at': self.created_at.isoformat() if self.created_at else None, 'expires_at': self.expires_at.isoformat() if self.expires_at else None, 'download_count': self.download_count}
@@ -1352,6 +1770,30 @@ class AdminUser(db.Model):
     def check_password(self, pwd): return check_password_hash(self.password_hash, pwd)
 
 
+class CacheEntry(db.Model):
+    __tablename__ = 'upstream_cache'
+    key = db.Column(db.String(100), primary_key=True)
+    kind = db.Column(db.String(20), nullable=False, index=True)
+    value = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    accessed_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    etag = db.Column(db.String(200))
+    last_modified = db.Column(db.String(100))
+
+
+# ==================== 运行指标 ====================
+
+class Metrics:
+    """进程内计数器，每个 gunicorn worker 各自统计"""
+    def __init__(self): self.lock, self.counters = threading.Lock(), Counter()
+    def inc(self, name, n=1):
+        with self.lock: self.counters[name] += n
+    def snapshot(self):
+        with self.lock: return dict(self.counters)
+
+metrics = Metrics()
+
+
 # ==================== 反编译核心 ====================
 
 # 注意：反编译过程是同步且耗时的。在生产环境中，如果访问量较大，
@@ -1362,6 +1804,25 @@ SHADOW_TEXTS = {"math_number": "0", "controller_shadow": "0", "text": "", "lists
 
 class DecompilerError(Exception): pass
 class WorkNotFoundError(DecompilerError): pass
+class UpstreamUnavailableError(DecompilerError):
+    def __init__(self, msg, retry_after=5): super().__init__(msg); self.retry_after = retry_after
+class DeadlineExceededError(DecompilerError): pass
+class UnsupportedWorkTypeError(DecompilerError): pass
+class IsolatedWorkerCrashError(DecompilerError): pass
+class AdmissionRejectedError(Exception):
+    def __init__(self, msg, retry_after=5): super().__init__(msg); self.retry_after = retry_after
+
+class Deadline:
+    """整个反编译请求的时间预算：各阶段的上游超时取自剩余时间，CPU 密集阶段定期检查是否超时"""
+    def __init__(self, seconds): self.expires = time.monotonic() + seconds if seconds else float('inf')
+    def remaining(self): return self.expires - time.monotonic()
+    def check(self):
+        if time.monotonic() >= self.expires: raise DeadlineExceededError("反编译超时")
+    def timeout(self, cap=None):
+        self.check(); r = self.remaining()
+        return (None if r == float('inf') else r) if cap is None else min(cap, r)
+
+UNLIMITED = Deadline(None)
 
 def rand_id(): return ''.join(random.choice('0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(20))
 
@@ -1376,47 +1837,457 @@ def create_shadow(stype, bid=None, txt=None):
     return ElementTree.tostring(s, encoding='unicode')
 
 
+class TTLCache:
+    """存放在数据库中的 LRU+TTL 缓存，gunicorn 各 worker 共享；读写失败时按未命中处理"""
+    def __init__(self, kind, ttl_key): self.kind, self.ttl_key = kind, ttl_key
+
+    @property
+    def ttl(self): return app.config[self.ttl_key]
+
+    def get(self, key):
+        if self.ttl <= 0: return None
+        try:
+            e, now = db.session.get(CacheEntry, f"{self.kind}:{key}"), datetime.utcnow()
+            if not e or e.expires_at < now: metrics.inc(f"cache_{self.kind}_miss"); return None
+            if (now - e.accessed_at).total_seconds() > 60: e.accessed_at = now; db.session.commit()
+            metrics.inc(f"cache_{self.kind}_hit"); return json_loads(e.value)
+        except SQLAlchemyError: db.session.rollback(); metrics.inc(f"cache_{self.kind}_miss"); return None
+
+    def get_stale(self, key):
+        """已过期但带有 ETag/Last-Modified 的条目，可用于条件请求"""
+        if self.ttl <= 0: return None
+        try: e = db.session.get(CacheEntry, f"{self.kind}:{key}")
+        except SQLAlchemyError: db.session.rollback(); return None
+        if not e or not (e.etag or e.last_modified): return None
+        return {'value': json_loads(e.value), 'etag': e.etag, 'last_modified': e.last_modified, 'size': len(e.value.encode('utf-8'))}
+
+    def refresh(self, key):
+        now = datetime.utcnow()
+        try: CacheEntry.query.filter_by(key=f"{self.kind}:{key}").update({'expires_at': now + timedelta(seconds=self.ttl), 'accessed_at': now}); db.session.commit()
+        except SQLAlchemyError: db.session.rollback()
+
+    def put(self, key, value, etag=None, last_modified=None):
+        if self.ttl <= 0: return
+        now = datetime.utcnow()
+        try:
+            db.session.merge(CacheEntry(key=f"{self.kind}:{key}", kind=self.kind, value=json_dumps(value, ensure_ascii=False), expires_at=now + timedelta(seconds=self.ttl), accessed_at=now, etag=etag, last_modified=last_modified)); db.session.commit()
+            over = CacheEntry.query.count() - app.config['CACHE_MAX_ENTRIES']
+            if over > 0:
+                old = [k for (k,) in db.session.query(CacheEntry.key).order_by(CacheEntry.accessed_at).limit(over)]
+                CacheEntry.query.filter(CacheEntry.key.in_(old)).delete(synchronize_session=False); db.session.commit()
+        except SQLAlchemyError: db.session.rollback()
+
+    @staticmethod
+    def purge(kind=None, key=None):
+        q = CacheEntry.query
+        if kind: q = q.filter_by(kind=kind)
+        if key is not None: q = q.filter(CacheEntry.key.like(f"%:{key}") | CacheEntry.key.like(f"%:{key}:%"))
+        n = q.delete(synchronize_session=False); db.session.commit(); return n
+
+work_info_cache, compiled_url_cache = TTLCache('info', 'CACHE_INFO_TTL'), TTLCache('url', 'CACHE_URL_TTL')
+negative_cache = TTLCache('negative', 'CACHE_NEGATIVE_TTL')  # 作品ID -> {'kind': 'not_found' / 'unsupported', 'error': 错误信息}
+
+
+class DiskCache:
+    """限制总字节数的磁盘缓存：数据文件 + 元数据文件，原子写入，读取时校验 sha256，按最近使用淘汰"""
+    def __init__(self, folder, max_bytes): self.folder, self.max_bytes, self.lock = folder, max_bytes, threading.Lock()
+
+    def _path(self, key): return os.path.join(self.folder, key[:2], key)
+
+    def _write(self, path, data):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f: f.write(data)
+        os.replace(tmp, path)
+
+    def get(self, key):
+        """返回 (数据, 元数据)，不存在或已损坏时返回 (None, None)"""
+        if self.max_bytes <= 0: return None, None
+        p = self._path(key)
+        try:
+            with open(f"{p}.meta", encoding='utf-8') as f: meta = json.load(f)
+            with open(p, 'rb') as f: data = f.read()
+        except (OSError, ValueError): return None, None
+        if len(data) != meta.get('size') or hashlib.sha256(data).hexdigest() != meta.get('sha256'):
+            metrics.inc('disk_cache_corrupt'); self.delete(key); return None, None
+        try: os.utime(p)
+        except OSError: pass
+        return data, meta
+
+    def put(self, key, data, evict=True, **meta):
+        if self.max_bytes <= 0 or len(data) > self.max_bytes: return
+        p = self._path(key); meta.update(size=len(data), sha256=hashlib.sha256(data).hexdigest(), stored_at=time.time())
+        try:
+            os.makedirs(os.path.dirname(p), exist_ok=True)
+            self._write(p, data); self._write(f"{p}.meta", json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+        except OSError as e: print(f"写入磁盘缓存失败: {e}"); return
+        if evict: self.evict()
+
+    def update_meta(self, key, meta):
+        try: self._write(f"{self._path(key)}.meta", json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+        except OSError: pass
+
+    def delete(self, key):
+        for f in (f"{self._path(key)}.meta", self._path(key)):
+            try: os.remove(f)
+            except OSError: pass
+
+    def usage(self):
+        fs = []
+        for root, _, names in os.walk(self.folder):
+            for n in names:
+                if n.endswith('.tmp'): continue
+                try: st = os.stat(os.path.join(root, n)); fs.append((st.st_mtime, st.st_size, n))
+                except OSError: pass
+        return fs
+
+    def summary(self):
+        fs = self.usage(); return {'files': sum(1 for f in fs if f[2].endswith('.meta')), 'bytes': sum(f[1] for f in fs), 'max_bytes': self.max_bytes}
+
+    def evict(self):
+        if not self.lock.acquire(blocking=False): return
+        try:
+            fs = self.usage(); total = sum(sz for _, sz, _ in fs)
+            for _, sz, n in sorted(f for f in fs if not f[2].endswith('.meta')):
+                if total <= self.max_bytes: break
+                self.delete(n); total -= sz
+        finally: self.lock.release()
+
+payload_cache = DiskCache(app.config['PAYLOAD_CACHE_FOLDER'], app.config['PAYLOAD_CACHE_MAX_MB'] * 1024 * 1024)
+actor_cache = DiskCache(app.config['ACTOR_CACHE_FOLDER'], app.config['ACTOR_CACHE_MAX_MB'] * 1024 * 1024)
+
+
+class LocalStorage:
+    """本地磁盘存储，记录中保存文件路径"""
+    def __init__(self, folder): self.folder = folder
+
+    def save(self, name, write):
+        fp = os.path.join(self.folder, name); os.makedirs(os.path.dirname(fp), exist_ok=True)
+        with open(fp, 'w', encoding='utf-8') as f: write(f)
+        return fp, os.path.getsize(fp)
+
+    def exists(self, fp): return os.path.exists(fp)
+
+    def delete(self, fp):
+        try: os.remove(fp)
+        except OSError: pass
+
+    def delete_many(self, fps):
+        """返回删除失败的路径，文件已不存在视为成功"""
+        failed = []
+        for fp in fps:
+            try: os.remove(fp)
+            except FileNotFoundError: pass
+            except OSError: failed.append(fp)
+        return failed
+
+    def free_bytes(self): return shutil.disk_usage(self.folder).free
+
+    def send(self, fp, name, mimetype):
+        accel = app.config['DOWNLOAD_ACCEL']
+        if accel in ('nginx', 'sendfile'):
+            rel = os.path.relpath(os.path.abspath(fp), os.path.abspath(self.folder))
+            if not rel.startswith('..'):  # 文件不在上传目录下时退回由 Flask 发送
+                r = Response(mimetype=mimetype); r.headers['Content-Disposition'] = content_disposition(name)
+                if accel == 'nginx': r.headers['X-Accel-Redirect'] = app.config['DOWNLOAD_ACCEL_PREFIX'].rstrip('/') + '/' + quote(rel.replace(os.sep, '/'))
+                else: r.headers['X-Sendfile'] = os.path.abspath(fp)
+                return r
+        # conditional=True：支持 Range 分段下载与 If-Range / ETag 条件请求
+        return send_file(fp, as_attachment=True, download_name=name, mimetype=mimetype, conditional=True)
+
+
+class S3Storage:
+    """S3 兼容对象存储（AWS S3、MinIO 等），记录中保存 s3://bucket/key；下载默认重定向到预签名地址"""
+    def __init__(self, bucket, prefix):
+        if boto3 is None: raise RuntimeError("STORAGE_BACKEND=s3 需要安装 boto3: pip install boto3")
+        if not bucket: raise RuntimeError("STORAGE_BACKEND=s3 需要设置 S3_BUCKET")
+        self.bucket, self.prefix = bucket, prefix
+        self.client = boto3.client('s3', endpoint_url=app.config['S3_ENDPOINT_URL'], region_name=app.config['S3_REGION'], aws_access_key_id=app.config['S3_ACCESS_KEY_ID'], aws_secret_access_key=app.config['S3_SECRET_ACCESS_KEY'], config=BotoConfig(signature_version='s3v4', s3={'addressing_style': 'path'} if app.config['S3_ENDPOINT_URL'] else {}))
+
+    def _key(self, loc): return loc.split('/', 3)[3]
+
+    def save(self, name, write):
+        """先写入临时文件再分片上传，内存占用与输出大小无关"""
+        key = self.prefix + name
+        with tempfile.TemporaryFile() as tmp:
+            w = io.TextIOWrapper(tmp, encoding='utf-8'); write(w); w.flush(); w.detach(); size = tmp.tell(); tmp.seek(0)
+            self.client.upload_fileobj(tmp, self.bucket, key, ExtraArgs={'ContentType': 'application/json' if name.endswith('.json') else 'application/octet-stream'})
+        return f"s3://{self.bucket}/{key}", size
+
+    def exists(self, loc):
+        try: self.client.head_object(Bucket=self.bucket, Key=self._key(loc)); return True
+        except ClientError: return False
+
+    def delete(self, loc):
+        try: self.client.delete_object(Bucket=self.bucket, Key=self._key(loc))
+        except ClientError as e: print(f"删除对象失败 {loc}: {e}")
+
+    def delete_many(self, locs):
+        """DeleteObjects 每次最多 1000 个键，返回删除失败的位置"""
+        failed = []
+        for part in chunks(locs, 1000):
+            try: bad = {e['Key'] for e in self.client.delete_objects(Bucket=self.bucket, Delete={'Objects': [{'Key': self._key(l)} for l in part], 'Quiet': True}).get('Errors', [])}
+            except ClientError as e: print(f"批量删除对象失败: {e}"); failed += part; continue
+            failed += [l for l in part if self._key(l) in bad]
+        return failed
+
+    def free_bytes(self): return None
+
+    def send(self, loc, name, mimetype):
+        if app.config['S3_PRESIGN']:
+            return redirect(self.client.generate_presigned_url('get_object', Params={'Bucket': self.bucket, 'Key': self._key(loc), 'ResponseContentDisposition': content_disposition(name), 'ResponseContentType': mimetype}, ExpiresIn=app.config['S3_PRESIGN_EXPIRES']))
+        kw = {'Range': request.headers['Range']} if request.headers.get('Range') else {}
+        try: o = self.client.get_object(Bucket=self.bucket, Key=self._key(loc), **kw)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') == 'InvalidRange': return Response(status=416)
+            raise
+        r = Response(o['Body'].iter_chunks(64 * 1024), status=206 if o.get('ContentRange') else 200, mimetype=mimetype, direct_passthrough=True)
+        r.headers.update({'Content-Disposition': content_disposition(name), 'Content-Length': str(o['ContentLength']), 'Accept-Ranges': 'bytes'})
+        if o.get('ContentRange'): r.headers['Content-Range'] = o['ContentRange']
+        return r
+
+
+class OutputStore:
+    """反编译结果文件：按哈希分散到 256 个前缀下，存放在配置的存储后端；总大小超出配额或磁盘剩余空间不足时，按策略提前删除"""
+    def __init__(self):
+        self.local, self.lock, self.checked = LocalStorage(app.config['UPLOAD_FOLDER']), threading.Lock(), float('-inf')
+        self.s3 = S3Storage(app.config['S3_BUCKET'], app.config['S3_PREFIX']) if app.config['STORAGE_BACKEND'] == 's3' else None
+        self.backend = self.s3 or self.local
+
+    def _for(self, loc): return self.s3 if self.s3 and loc.startswith('s3://') else self.local
+
+    def write(self, wid, rid, ext, write):
+        """write(f) 向文本文件对象写入内容，返回 (存储位置, 字节数)"""
+        return self.backend.save(f"{hashlib.md5(f'{wid}_{rid}'.encode()).hexdigest()[:2]}/{wid}_{rid}{ext}", write)
+
+    def exists(self, loc): return self._for(loc).exists(loc)
+    def remove(self, loc): self._for(loc).delete(loc)
+    def remove_many(self, locs):
+        """批量删除，返回删除失败的位置"""
+        s3 = [l for l in locs if self._for(l) is self.s3]
+        return (self.s3.delete_many(s3) if s3 else []) + self.local.delete_many([l for l in locs if self._for(l) is self.local])
+    def send(self, loc, name, mimetype): return self._for(loc).send(loc, name, mimetype)
+
+    def usage(self):
+        n, b = db.session.query(func.count(DecompilerRecord.id), func.coalesce(func.sum(DecompilerRecord.file_size), 0)).filter(DecompilerRecord.file_path.isnot(None)).one()
+        return {'backend': app.config['STORAGE_BACKEND'], 'files': n, 'bytes': int(b), 'quota_bytes': app.config['OUTPUT_QUOTA_MB'] * 1024 * 1024, 'disk_free_bytes': self.backend.free_bytes(), 'policy': app.config['OUTPUT_EVICTION_POLICY']}
+
+    def enforce(self, keep=None, min_interval=0):
+        """删除文件直到回到配额内，keep 为刚生成、不参与淘汰的记录；返回删除的文件数。
+        统计占用要扫描整张记录表，min_interval 秒内已检查过时直接跳过"""
+        if not self.lock.acquire(blocking=False): return 0
+        try:
+            if time.monotonic() - self.checked < min_interval: return 0
+            self.checked = time.monotonic()
+            u = self.usage(); free = u['disk_free_bytes']
+            over = max(u['bytes'] - u['quota_bytes'] if u['quota_bytes'] else 0, app.config['OUTPUT_MIN_FREE_MB'] * 1024 * 1024 - free if free is not None else 0)
+            if over <= 0: return 0
+            order = (DecompilerRecord.download_count, DecompilerRecord.created_at) if app.config['OUTPUT_EVICTION_POLICY'] == 'least_downloaded' else (DecompilerRecord.created_at,)
+            rows = db.session.query(DecompilerRecord.id, DecompilerRecord.file_path, DecompilerRecord.file_size).filter(DecompilerRecord.file_path.isnot(None), DecompilerRecord.id != keep).order_by(*order).all(); ids = []
+            for rid, fp, sz in rows:
+                if over <= 0: break
+                self.remove(fp); ids.append(rid); over -= sz or 0
+            if ids:
+                DecompilerRecord.query.filter(DecompilerRecord.id.in_(ids)).update({DecompilerRecord.file_path: None}, synchronize_session=False); db.session.commit()
+                metrics.inc('output_evicted', len(ids)); print(f"[{datetime.now()}] 输出文件超出配额，已删除 {len(ids)} 个文件")
+            return len(ids)
+        except (OSError, SQLAlchemyError) as e: db.session.rollback(); print(f"输出文件淘汰失败: {e}"); return 0
+        finally: self.lock.release()
+
+output_store = OutputStore()
+
+def conditional_headers(etag, last_modified):
+    h = {}
+    if etag: h['If-None-Match'] = etag
+    if last_modified: h['If-Modified-Since'] = last_modified
+    return h
+
+def record_revalidated(size): metrics.inc('revalidate_not_modified'); metrics.inc('revalidate_bytes_saved', size)
+
+upstream_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='upstream')
+
+
+class CircuitBreaker:
+    """连续超时/5xx 达到阈值后断开，冷却期内直接失败；冷却结束后放行一个探测请求（半开），成功则恢复"""
+    def __init__(self, name):
+        self.name, self.lock, self.state, self.failures, self.opened_at, self.probing = name, threading.Lock(), 'closed', 0, 0.0, False
+        self.latency = deque(maxlen=200)  # 近期成功请求耗时（秒），用于计算对冲延迟
+
+    def before(self):
+        with self.lock:
+            if self.state == 'closed': return
+            if self.state == 'open' and time.time() - self.opened_at >= app.config['CIRCUIT_COOLDOWN']: self.state = 'half_open'
+            if self.state == 'half_open' and not self.probing: self.probing = True; return
+        metrics.inc('circuit_rejected'); raise UpstreamUnavailableError(f"上游服务 {self.name} 暂时不可用，请稍后再试", self.retry_after())
+
+    def success(self, elapsed=None):
+        with self.lock:
+            self.state, self.failures, self.probing = 'closed', 0, False
+            if elapsed is not None: self.latency.append(elapsed)
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= app.config['CIRCUIT_FAILURE_THRESHOLD']:
+                if self.state != 'open': metrics.inc('circuit_opened')
+                self.state, self.opened_at, self.probing = 'open', time.time(), False
+
+    def cancel(self):
+        with self.lock: self.probing = False
+
+    def retry_after(self): return max(1, int(self.opened_at + app.config['CIRCUIT_COOLDOWN'] - time.time()) + 1)
+
+    def hedge_delay(self):
+        """近期延迟的分位数；样本不足或未处于正常状态时返回 None（不对冲）"""
+        with self.lock:
+            if self.state != 'closed' or len(self.latency) < app.config['HEDGE_MIN_SAMPLES']: return None
+            s = sorted(self.latency)
+        return max(s[min(len(s) - 1, int(len(s) * app.config['HEDGE_PERCENTILE'] / 100))], app.config['HEDGE_MIN_DELAY_MS'] / 1000)
+
+    def snapshot(self):
+        d = self.hedge_delay()
+        with self.lock: return {'host': self.name, 'state': self.state, 'failures': self.failures, 'opened_at': datetime.utcfromtimestamp(self.opened_at).isoformat() if self.opened_at else None, 'hedge_delay_ms': round(d * 1000) if d else None}
+
+
+class Upstream:
+    """所有上游 GET 请求的出口：按主机熔断，并限制同时进行的请求数（舱壁）；上游请求都是幂等 GET，可按需对冲"""
+    HEDGE_BURST = 10  # 对冲令牌桶容量
+
+    def __init__(self, limit):
+        self.limit, self.slots, self.breakers, self.lock, self.in_flight = limit, threading.BoundedSemaphore(limit), {}, threading.Lock(), 0
+        self.hedge_tokens, self.pool = 0.0, ThreadPoolExecutor(max_workers=limit * 2, thread_name_prefix='hedge')
+
+    def breaker(self, url):
+        host = urlsplit(url).netloc
+        with self.lock: return self.breakers.setdefault(host, CircuitBreaker(host))
+
+    def get(self, url, timeout, headers=None, cap=None):
+        """cap: 该请求原本的超时上限；timeout 被时间预算截短到 cap 以下时，超时是预算用尽所致，不计入熔断"""
+        br, limited = self.breaker(url), cap is not None and timeout < cap; br.before()
+        delay = br.hedge_delay() if app.config['HEDGE_ENABLED'] else None
+        if delay is None or delay >= timeout: return self._fetch(br, url, timeout, headers, limited)
+        return self._hedged(br, url, timeout, headers, delay, limited)
+
+    def _fetch(self, br, url, timeout, headers, limited=False):
+        if not self.slots.acquire(timeout=min(app.config['UPSTREAM_QUEUE_TIMEOUT'], timeout)):
+            br.cancel(); metrics.inc('upstream_bulkhead_rejected'); raise UpstreamUnavailableError("上游请求过多，请稍后再试")
+        with self.lock: self.in_flight += 1
+        t0 = time.monotonic()
+        try: r = requests.get(url, headers=headers, timeout=timeout)
+        except requests.Timeout: br.cancel() if limited else br.failure(); raise
+        except requests.ConnectionError: br.failure(); raise
+        except Exception: br.cancel(); raise
+        finally:
+            self.slots.release()
+            with self.lock: self.in_flight -= 1
+        br.failure() if r.status_code >= 500 else br.success(time.monotonic() - t0)
+        return r
+
+    def _take_hedge_token(self):
+        """令牌桶：每个请求补充 HEDGE_MAX_RATIO 个令牌，每次对冲消耗一个，限制对冲带来的额外上游负载"""
+        with self.lock:
+            if self.hedge_tokens < 1: metrics.inc('hedge_throttled'); return False
+            self.hedge_tokens -= 1; return True
+
+    def _hedged(self, br, url, timeout, headers, delay, limited):
+        with self.lock: self.hedge_tokens = min(self.HEDGE_BURST, self.hedge_tokens + app.config['HEDGE_MAX_RATIO'])
+        first = self.pool.submit(self._fetch, br, url, timeout, headers, limited)
+        if wait([first], timeout=delay)[0] or not self._take_hedge_token(): return first.result()
+        metrics.inc('hedge_sent'); second = self.pool.submit(self._fetch, br, url, timeout - delay, headers, limited); pending = {first, second}
+        while pending:  # 先成功返回的请求生效，落后的请求在后台自然结束
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    if f is second: metrics.inc('hedge_won')
+                    return f.result()
+        return first.result()  # 两个请求都失败时抛出原请求的异常
+
+    def snapshot(self):
+        with self.lock: return {'in_flight': self.in_flight, 'limit': self.limit, 'hedge_enabled': app.config['HEDGE_ENABLED'], 'hedge_tokens': round(self.hedge_tokens, 2), 'breakers': [b.snapshot() for b in list(self.breakers.values())]}
+
+upstream = Upstream(app.config['UPSTREAM_MAX_CONCURRENCY'])
+
+
 class CodemaoAPI:
     @staticmethod
-    def get_work_info(wid):
+    def get_work_info(wid, on_miss=None, deadline=UNLIMITED):
+        info = work_info_cache.get(wid)
+        if info is not None: return info
+        if on_miss: on_miss()
+        stale = work_info_cache.get_stale(wid)
         try:
-            r = requests.get(f"https://api.codemao.cn/creation-tools/v1/works/{wid}", timeout=30)
-            if r.status_code != 200: raise WorkNotFoundError(f"作品不存在: {wid}")
-            d = r.json()
-            return {"id": d["id"], "name": d["work_name"], "type": d["type"], "version": d["bcm_version"], "author_id": d["user_info"]["id"], "author_name": d["user_info"]["nickname"]}
+            r = upstream.get(f"{app.config['CODEMAO_API_BASE']}/creation-tools/v1/works/{wid}", headers=conditional_headers(stale['etag'], stale['last_modified']) if stale else None, timeout=deadline.timeout(30), cap=30)
+            if r.status_code == 304 and stale: work_info_cache.refresh(wid); record_revalidated(stale['size']); return stale['value']
+            if r.status_code == 404: raise WorkNotFoundError(f"作品不存在: {wid}")
+            if r.status_code != 200: raise DecompilerError(f"获取作品信息失败: HTTP {r.status_code}")  # 429 / 403 等限流不代表作品不存在，不进入否定缓存
+            d = json_loads(r.content)
+            info = {"id": d["id"], "name": d["work_name"], "type": d["type"], "version": d["bcm_version"], "author_id": d["user_info"]["id"], "author_name": d["user_info"]["nickname"]}
         except (KeyError, json.JSONDecodeError): raise WorkNotFoundError(f"作品不存在: {wid}")
+        work_info_cache.put(wid, info, etag=r.headers.get('ETag'), last_modified=r.headers.get('Last-Modified')); return info
+
+    @staticmethod
+    def get_compiled_url(info, speculative=None, deadline=UNLIMITED):
+        """speculative: 预先发出的 Kitten 编译地址请求，命中缓存或类型不符时丢弃"""
+        key = f"{info['id']}:{info['type']}"; url = compiled_url_cache.get(key)
+        if speculative and url is None and info["type"] in ("KITTEN4", "KITTEN3", "KITTEN2"):
+            try: url = speculative.result(timeout=deadline.timeout(30)); metrics.inc('speculative_used')
+            except Exception: metrics.inc('speculative_failed')
+            if url is not None: compiled_url_cache.put(key, url); return url
+        elif speculative: speculative.cancel(); metrics.inc('speculative_wasted')
+        if url is None: url = CodemaoAPI._fetch_compiled_url(info, deadline); compiled_url_cache.put(key, url)
+        return url
+
+    @staticmethod
+    def fetch_kitten_url(wid, deadline=UNLIMITED):
+        return json_loads(upstream.get(f"{app.config['CODEMAO_CREATION_BASE']}/kitten/r2/work/player/load/{wid}", timeout=deadline.timeout(30), cap=30).content)["source_urls"][0]
 
     @staticmethod
-    def get_compiled_url(info):
+    def _fetch_compiled_url(info, deadline=UNLIMITED):
         wid, wt = info["id"], info["type"]
-        if wt in ("KITTEN4", "KITTEN3", "KITTEN2"):
-            return requests.get(f"https://api-creation.codemao.cn/kitten/r2/work/player/load/{wid}", timeout=30).json()["source_urls"][0]
+        if wt in ("KITTEN4", "KITTEN3", "KITTEN2"): return CodemaoAPI.fetch_kitten_url(wid, deadline)
         elif wt == "COCO":
-            return requests.get(f"https://api-creation.codemao.cn/coconut/web/work/{wid}/load", timeout=30).json()["data"]["bcmc_url"]
-        raise DecompilerError(f"不支持的作品类型: {wt}")
+            return json_loads(upstream.get(f"{app.config['CODEMAO_CREATION_BASE']}/coconut/web/work/{wid}/load", timeout=deadline.timeout(30), cap=30).content)["data"]["bcmc_url"]
+        raise UnsupportedWorkTypeError(f"不支持的作品类型: {wt}")
+
+
+OUTPUT_TYPES = SHADOW_ALL_TYPES | {"logic_boolean", "procedures_2_stable_parameter"}
+NO_CONN = {}  # 没有子连接的积木共用同一个空连接表，只读
+
+class BlockRecord:
+    """积木的紧凑表示：只保存各积木不同的字段，写出时由 json_default 展开为完整结构"""
+    __slots__ = ("id", "type", "shadows", "fields", "mutation", "parent_id", "disabled")
+    def __init__(self, bid, btype, shadows, fields): self.id, self.type, self.shadows, self.fields, self.mutation, self.parent_id, self.disabled = bid, btype, shadows, fields, "", None, False
+    def __getitem__(self, k): return getattr(self, k)
+    def __setitem__(self, k, v): setattr(self, k, v)
+    def to_dict(self):
+        return {"id": self.id, "type": self.type, "location": [0, 0], "is_shadow": self.type in SHADOW_ALL_TYPES, "collapsed": False, "disabled": self.disabled, "deletable": True, "movable": True, "editable": True, "visible": "visible", "shadows": self.shadows, "fields": self.fields, "field_constraints": {}, "field_extra_attr": {}, "comment": None, "mutation": self.mutation, "parent_id": self.parent_id, "is_output": self.type in OUTPUT_TYPES}
 
+def json_default(o):
+    if isinstance(o, BlockRecord): return o.to_dict()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
 
 class BlockDecompiler:
-    def __init__(self, compiled, actor): self.compiled, self.actor, self.block, self.conn, self.shadows, self.fields = compiled, actor, {}, {}, {}, {}
+    def __init__(self, compiled, actor): self.compiled, self.actor, self.block, self.conn, self.shadows, self.fields = compiled, actor, None, None, {}, {}
     def start(self): self._info(); self._nexts(); self._children(); self._conds(); self._params(); return self.block
     def _info(self):
-        self.id = self.block["id"] = self.compiled["id"]; self.type = self.block["type"] = self.compiled["type"]
-        self.block.update({"location": [0, 0], "is_shadow": self.type in SHADOW_ALL_TYPES, "collapsed": False, "disabled": False, "deletable": True, "movable": True, "editable": True, "visible": "visible", "shadows": self.shadows, "fields": self.fields, "field_constraints": {}, "field_extra_attr": {}, "comment": None, "mutation": "", "parent_id": None, "is_output": self.type in SHADOW_ALL_TYPES or self.type in {"logic_boolean", "procedures_2_stable_parameter"}})
-        self.actor.conns[self.id] = self.conn; self.actor.blocks[self.id] = self.block
+        self.id, self.type = self.compiled["id"], self.compiled["type"]; self.block = BlockRecord(self.id, self.type, self.shadows, self.fields)
+        self.actor.conns[self.id] = NO_CONN; self.actor.blocks[self.id] = self.block
+    def _connect(self, bid, c):
+        if self.conn is None: self.conn = self.actor.conns[self.id] = {}
+        self.conn[bid] = c
     def _nexts(self):
         if "next_block" in self.compiled:
-            nb = get_block_decompiler(self.compiled["next_block"], self.actor).start(); nb["parent_id"] = self.id; self.conn[nb["id"]] = {"type": "next"}
+            nb = get_block_decompiler(self.compiled["next_block"], self.actor).start(); nb["parent_id"] = self.id; self._connect(nb["id"], {"type": "next"})
     def _children(self):
         if "child_block" in self.compiled:
             for i, c in enumerate(self.compiled["child_block"]):
                 if c:
-                    cb = get_block_decompiler(c, self.actor).start(); cb["parent_id"] = self.id; n = self._child_name(i); self.conn[cb["id"]] = {"type": "input", "input_type": "statement", "input_name": n}; self.shadows[n] = ""
+                    cb = get_block_decompiler(c, self.actor).start(); cb["parent_id"] = self.id; n = self._child_name(i); self._connect(cb["id"], {"type": "input", "input_type": "statement", "input_name": n}); self.shadows[n] = ""
     def _child_name(self, i): return "DO"
     def _conds(self):
         if "conditions" in self.compiled:
             for i, c in enumerate(self.compiled["conditions"]):
                 cb = get_block_decompiler(c, self.actor).start(); cb["parent_id"] = self.id; n = f"IF{i}"
-                if cb["type"] != "logic_empty": self.conn[cb["id"]] = {"type": "input", "input_type": "value", "input_name": n}
+                if cb["type"] != "logic_empty": self._connect(cb["id"], {"type": "input", "input_type": "value", "input_name": n})
                 self.shadows[n] = create_shadow("logic_empty", cb["id"])
     def _params(self):
         for n, v in self.compiled.get("params", {}).items():
@@ -1425,7 +2296,7 @@ class BlockDecompiler:
                 if pt in SHADOW_ALL_TYPES:
                     for fn, fv in pb["fields"].items(): self.shadows[n] = create_shadow(pt, pb["id"], fv)
                 else: self.shadows[n] = create_shadow("logic_empty" if n in {"condition", "BOOL"} else "math_number")
-                self.conn[pb["id"]] = {"type": "input", "input_type": "value", "input_name": n}
+                self._connect(pb["id"], {"type": "input", "input_type": "value", "input_name": n})
             else: self.fields[n] = v
 
 class ControlsIfDecompiler(BlockDecompiler):
@@ -1442,7 +2313,7 @@ class ProcDefDecompiler(BlockDecompiler):
         m = ElementTree.Element("mutation")
         for i, (pn, _) in enumerate(self.compiled.get("params", {}).items()):
             ni = f"PARAMS{i}"; ElementTree.SubElement(m, "arg").set("name", ni); self.shadows[ni] = create_shadow("math_number")
-            pb = get_block_decompiler({"id": rand_id(), "kind": "domain_block", "type": "procedures_2_stable_parameter", "params": {"param_name": pn, "param_default_value": ""}}, self.actor).start(); pb["parent_id"] = self.block["id"]; self.conn[pb["id"]] = {"type": "input", "input_type": "value", "input_name": ni}
+            pb = get_block_decompiler({"id": rand_id(), "kind": "domain_block", "type": "procedures_2_stable_parameter", "params": {"param_name": pn, "param_default_value": ""}}, self.actor).start(); pb["parent_id"] = self.block["id"]; self._connect(pb["id"], {"type": "input", "input_type": "value", "input_name": ni})
         self.block["mutation"] = ElementTree.tostring(m, encoding='unicode'); return self.block
     def _child_name(self, i): return "STACK"
 
@@ -1453,7 +2324,7 @@ class ProcCallDecompiler(BlockDecompiler):
         except: fid, self.block["disabled"] = rand_id(), True
         self.shadows["NAME"], self.fields["NAME"] = "", n; m = ElementTree.Element("mutation"); m.set("name", n); m.set("def_id", fid)
         for i, (pn, v) in enumerate(self.compiled.get("params", {}).items()):
-            pb = get_block_decompiler(v, self.actor).start(); self.shadows[f"ARG{i}"] = create_shadow("default_value", pb["id"]); ElementTree.SubElement(m, "procedures_2_parameter_shadow").set("name", pn); self.conn[pb["id"]] = {"type": "input", "input_type": "value", "input_name": f"ARG{i}"}
+            pb = get_block_decompiler(v, self.actor).start(); self.shadows[f"ARG{i}"] = create_shadow("default_value", pb["id"]); ElementTree.SubElement(m, "procedures_2_parameter_shadow").set("name", pn); self._connect(pb["id"], {"type": "input", "input_type": "value", "input_name": f"ARG{i}"})
         self.block["mutation"] = ElementTree.tostring(m, encoding='unicode'); return self.block
 
 SPECIAL = {"controls_if": ControlsIfDecompiler, "controls_if_no_else": ControlsIfDecompiler, "procedures_2_defnoreturn": ProcDefDecompiler, "procedures_2_return_value": ProcDefDecompiler, "procedures_2_callnoreturn": ProcCallDecompiler, "procedures_2_callreturn": ProcCallDecompiler}
@@ -1464,13 +2335,69 @@ class ActorDecompiler:
     def prepare(self): self.actor["block_data_json"] = {"blocks": self.blocks, "connections": self.conns, "comments": {}}; [self.work.functions.__setitem__(n, f) for n, f in self.compiled.get("procedures", {}).items()]
     def start(self):
         [self.work.functions.__setitem__(n, ProcDefDecompiler(f, self).start()) for n, f in self.compiled.get("procedures", {}).items()]
-        [get_block_decompiler(b, self).start() for b in self.compiled.get("compiled_block_map", {}).values()]
+        for b in self.compiled.get("compiled_block_map", {}).values(): self.work.deadline.check(); get_block_decompiler(b, self).start()
+
+def _decompile_actor(args):
+    """子进程入口：只需要该角色可见的函数定义ID即可独立反编译"""
+    compiled, fids = args; t0 = time.perf_counter()
+    d = ActorDecompiler(SimpleNamespace(functions={n: {"id": i} for n, i in fids.items()}, deadline=UNLIMITED), {}, compiled); d.start()
+    return d.blocks, d.conns, time.perf_counter() - t0
+
+ACTOR_CACHE_VERSION = 1  # 反编译输出格式变化时加一，使旧的角色缓存失效
+PROC_NAME_RE = re.compile(r'"procedure_name":("(?:[^"\\]|\\.)*")')
+
+def actor_cache_key(compiled, fids):
+    """角色的反编译输出只取决于它的编译结果，以及其中引用的函数名当前对应的定义ID"""
+    text = json_dumps(compiled, ensure_ascii=False, separators=(',', ':'))  # 键顺序与编译文件一致，顺序不同只会导致未命中
+    used = {n: fids.get(n) for n in sorted({json.loads(m) for m in PROC_NAME_RE.findall(text)})}
+    return hashlib.sha256(f"{ACTOR_CACHE_VERSION}\n{text}\n{json.dumps(used, ensure_ascii=False)}".encode('utf-8')).hexdigest()
+
+_actor_pools = {}
+def get_actor_pool(workers):
+    if workers not in _actor_pools:  # fork 避免子进程重新导入 app；重新播种防止各子进程生成相同的随机ID
+        _actor_pools[workers] = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'), initializer=random.seed)
+    return _actor_pools[workers]
+
+def drop_actor_pool(workers, pool):
+    """子进程被杀（如内存不足）后进程池不再可用，超时后残留的任务也会拖慢下一个请求：丢弃该进程池，下次使用时重建"""
+    if _actor_pools.get(workers) is pool: del _actor_pools[workers]; metrics.inc('actor_pool_recycled')
+    pool.shutdown(wait=False, cancel_futures=True)
 
 class KittenDecompiler:
-    def __init__(self, info, work): self.info, self.work, self.functions = info, work, {}
+    def __init__(self, info, work, workers=None, deadline=UNLIMITED): self.info, self.work, self.functions, self.deadline, self.workers = info, work, {}, deadline, app.config['PARALLEL_ACTOR_WORKERS'] if workers is None else workers
     def start(self):
         ds = [ActorDecompiler(self, self._get_actor(a["id"]), a) for a in self.work.get("compile_result", [])]
-        [d.prepare() for d in ds]; [d.start() for d in ds]; self._write(); self._clean(); return self.work
+        [d.prepare() for d in ds]
+        parallel, cached = self.workers > 0 and len(ds) >= app.config['PARALLEL_ACTOR_MIN'], actor_cache.max_bytes > 0
+        if parallel or cached:
+            for d, f in zip(ds, self._visible_functions(ds)): d.fids, d.cache_key = f, actor_cache_key(d.compiled, f) if cached else None
+        todo = [d for d in ds if not (cached and self._load_cached(d))]
+        if parallel and len(todo) >= app.config['PARALLEL_ACTOR_MIN']: self._start_parallel(todo)
+        else:
+            for d in todo:
+                if parallel or cached: d.work = SimpleNamespace(functions={n: {"id": i} for n, i in d.fids.items()}, deadline=self.deadline)  # 取自缓存的角色不会重新登记函数定义，按该角色可见的函数表反编译
+                t0 = time.perf_counter(); d.start(); d.elapsed = time.perf_counter() - t0
+        if cached and todo: [actor_cache.put(d.cache_key, pickle.dumps((d.blocks, d.conns), pickle.HIGHEST_PROTOCOL), evict=False, elapsed=d.elapsed) for d in todo]; actor_cache.evict()
+        self.actor_count, self.block_count = len(ds), sum(len(d.blocks) for d in ds)
+        self._write(); self._clean(); return self.work
+    def _visible_functions(self, ds):
+        # 串行模式下每个角色看到的函数表 = prepare 后的表 + 此前（含自身）各角色重新写入的定义，这里按同样顺序还原
+        base, seen, out = {n: f["id"] for n, f in self.functions.items()}, {}, []
+        for d in ds: seen.update((n, f["id"]) for n, f in d.compiled.get("procedures", {}).items()); out.append({**base, **seen})
+        return out
+    def _load_cached(self, d):
+        data, meta = actor_cache.get(d.cache_key)
+        if data is None: metrics.inc('actor_cache_miss'); return False
+        d.blocks, d.conns = pickle.loads(data)  # 缓存目录只由本服务写入，与多进程反编译一样用 pickle 传递积木记录
+        d.actor["block_data_json"].update(blocks=d.blocks, connections=d.conns)
+        metrics.inc('actor_cache_hit'); metrics.inc('actor_cache_saved_ms', round(meta.get('elapsed', 0) * 1000)); return True
+    def _start_parallel(self, ds):
+        jobs, pool = [(d.compiled, d.fids) for d in ds], get_actor_pool(self.workers)
+        try:
+            for d, (blocks, conns, elapsed) in zip(ds, pool.map(_decompile_actor, jobs, timeout=self.deadline.timeout(), chunksize=max(1, len(jobs) // (self.workers * 4)))):
+                self.deadline.check(); d.blocks, d.conns, d.elapsed = blocks, conns, elapsed; d.actor["block_data_json"].update(blocks=blocks, connections=conns)
+        except (TimeoutError, DeadlineExceededError): drop_actor_pool(self.workers, pool); raise
+        except (BrokenProcessPool, CancelledError) as e: drop_actor_pool(self.workers, pool); raise DecompilerError("角色反编译进程异常退出") from e
     def _get_actor(self, aid): t = self.work.get("theatre", {}); return t.get("actors", {}).get(aid) or t.get("scenes", {}).get(aid, {})
     def _clean(self): [self.work.pop(k, None) for k in ["compile_result", "preview", "author_nickname"]]
     def _write(self):
@@ -1478,31 +2405,201 @@ class KittenDecompiler:
         self.work["last_toolbox_order"] = order
         self.work.update({"hidden_toolbox": {"toolbox": [], "blocks": []}, "work_source_label": 0, "sample_id": "", "project_name": self.info["name"], "toolbox_order": order})
 
+def count_blocks(o):
+    """Blockly JSON 中的积木数（带 type 的对象）"""
+    n, stack = 0, [o]
+    while stack:
+        x = stack.pop()
+        if isinstance(x, dict): n += "type" in x; stack.extend(x.values())
+        elif isinstance(x, list): stack.extend(x)
+    return n
+
 class CoCoDecompiler:
-    def __init__(self, info, work): self.info, self.work = info, work
-    def start(self): self._write(); self._clean(); return self.work
+    def __init__(self, info, work, deadline=UNLIMITED): self.info, self.work, self.deadline = info, work, deadline
+    def start(self):
+        self.actor_count, self.block_count = len(self.work.get("screenList", [])), count_blocks(self.work.get("blockJsonMap", {}))
+        self._write(); self._clean(); return self.work
     def _clean(self): [self.work.pop(k, None) for k in ["id", "screenList", "widgetMap", "variableMap", "gridMap", "blockJsonMap", "initialScreenId", "apiToken", "imageFileMap", "soundFileMap", "iconFileMap", "fontFileMap", "blockCode"]]
     def _write(self):
-        self.work.update({"authorId": self.info["author_id"], "title": self.info["name"], "screens": {}, "screenIds": [], "globalVariableList": [], "globalArrayList": [], "globalObjectList": [], "globalWidgets": self.work.get("widgetMap", {}), "globalWidgetIds": list(self.work.get("widgetMap", {}).keys()), "sourceTag": 1, "sourceId": ""})
-        for s in self.work.get("screenList", []):
-            sid = s["id"]; s["snapshot"] = ""; self.work["screens"][sid] = s; self.work["screenIds"].append(sid); s.update({"primitiveVariables": [], "arrayVariables": [], "objectVariables": [], "broadcasts": ["Hi"], "widgets": {}})
-            for wid in s.get("widgetIds", []) + s.get("invisibleWidgetIds", []):
-                if wid in self.work.get("widgetMap", {}): s["widgets"][wid] = self.work["widgetMap"][wid]
-        self.work["blockly"] = {sid: {"screenId": sid, "workspaceJson": blks, "workspaceOffset": {"x": 0, "y": 0}} for sid, blks in self.work.get("blockJsonMap", {}).items()}
-        for k, lk in [("imageFileMap", "imageFileList"), ("soundFileMap", "soundFileList"), ("iconFileMap", "iconFileList"), ("fontFileMap", "fontFileList")]: self.work[lk] = list(self.work.get(k, {}).values())
+        """单次遍历：控件表只取一次，按屏幕把可见 / 隐藏控件直接填入；积木工作区引用原对象，不复制"""
+        w, check = self.work, self.deadline.check; widgets = w.get("widgetMap", {}); screens, screen_ids, missing = {}, [], object()
+        w.update({"authorId": self.info["author_id"], "title": self.info["name"], "screens": screens, "screenIds": screen_ids, "globalVariableList": [], "globalArrayList": [], "globalObjectList": [], "globalWidgets": widgets, "globalWidgetIds": list(widgets), "sourceTag": 1, "sourceId": ""})
+        for s in w.get("screenList", ()):
+            check(); sid = s["id"]; s["snapshot"] = ""; screens[sid] = s; screen_ids.append(sid); sw = {}
+            for key in ("widgetIds", "invisibleWidgetIds"):
+                for wid in s.get(key, ()):
+                    v = widgets.get(wid, missing)
+                    if v is not missing: sw[wid] = v
+            s.update({"primitiveVariables": [], "arrayVariables": [], "objectVariables": [], "broadcasts": ["Hi"], "widgets": sw})
+        w["blockly"] = {sid: {"screenId": sid, "workspaceJson": blks, "workspaceOffset": {"x": 0, "y": 0}} for sid, blks in w.get("blockJsonMap", {}).items()}
+        for k, lk in (("imageFileMap", "imageFileList"), ("soundFileMap", "soundFileList"), ("iconFileMap", "iconFileList"), ("fontFileMap", "fontFileList")): w[lk] = list(w.get(k, {}).values())
+
+@contextmanager
+def timed(stats, phase):
+    t0 = time.perf_counter()
+    try: yield
+    finally: stats.setdefault('phase_ms', {})[phase] = round((time.perf_counter() - t0) * 1000, 1)
 
 class Decompiler:
     @staticmethod
-    def decompile(wid):
-        info = CodemaoAPI.get_work_info(wid); url = CodemaoAPI.get_compiled_url(info)
-        r = requests.get(url, timeout=60)
+    def decompile(wid, deadline=UNLIMITED, stats=None):
+        """stats: 传入字典时写入各阶段耗时、编译文件大小和积木 / 角色数"""
+        spec, stats = [], {} if stats is None else stats  # spec: 作品信息未命中缓存时，与之并行请求 Kitten 编译文件地址
+        on_miss = (lambda: spec.append(upstream_pool.submit(CodemaoAPI.fetch_kitten_url, wid, deadline))) if app.config['SPECULATIVE_KITTEN_LOAD'] else None
+        try:
+            with timed(stats, 'info'): info = CodemaoAPI.get_work_info(wid, on_miss, deadline)
+            with timed(stats, 'url'): url = CodemaoAPI.get_compiled_url(info, spec[0] if spec else None, deadline)
+            with timed(stats, 'payload'): payload = Decompiler.fetch_payload(url, deadline); stats['payload_bytes'] = len(payload)
+            if app.config['ISOLATED_WORKERS'] > 0: return info, isolated_pool.run(info, payload, deadline, stats)
+            with timed(stats, 'parse'): work = json_loads(payload); wt = info["type"]
+            with timed(stats, 'decompile'):
+                d = KittenDecompiler(info, work, deadline=deadline) if wt in ("KITTEN4", "KITTEN3", "KITTEN2") else CoCoDecompiler(info, work, deadline); out = d.start()
+            stats.update(actor_count=d.actor_count, block_count=d.block_count); return info, out
+        except (requests.Timeout, TimeoutError) as e:
+            if deadline.remaining() <= 0: raise DeadlineExceededError("反编译超时") from e  # 超时由预算耗尽引起
+            raise
+        except (WorkNotFoundError, UnsupportedWorkTypeError) as e:
+            negative_cache.put(wid, {'kind': 'not_found' if isinstance(e, WorkNotFoundError) else 'unsupported', 'error': str(e)}); raise
+
+    @staticmethod
+    def fetch_payload(url, deadline=UNLIMITED):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest(); data, meta = payload_cache.get(key)
+        if data is not None and time.time() - meta['stored_at'] < app.config['PAYLOAD_CACHE_TTL']: metrics.inc('payload_cache_hit'); return data
+        stale = data is not None and (meta.get('etag') or meta.get('last_modified'))
+        if not stale: metrics.inc('payload_cache_miss')
+        r = upstream.get(url, headers=conditional_headers(meta.get('etag'), meta.get('last_modified')) if stale else None, timeout=deadline.timeout(60), cap=60)
+        if r.status_code == 304 and stale:
+            meta['stored_at'] = time.time(); payload_cache.update_meta(key, meta); record_revalidated(len(data)); return data
         if r.status_code != 200: raise DecompilerError(f"获取编译文件失败: HTTP {r.status_code}")
-        work = r.json(); wt = info["type"]
-        return info, (KittenDecompiler if wt in ("KITTEN4", "KITTEN3", "KITTEN2") else CoCoDecompiler)(info, work).start()
+        payload_cache.put(key, r.content, url=url, etag=r.headers.get('ETag'), last_modified=r.headers.get('Last-Modified')); return r.content
+
+
+# ==================== 隔离反编译进程 ====================
+
+class IsolatedOutput:
+    """子进程写好的输出文件（临时文件，复制到输出存储后删除）"""
+    def __init__(self, path): self.path = path
+    def discard(self):
+        try: os.remove(self.path)
+        except OSError: pass
+
+
+def _isolated_main(conn):
+    """子进程入口：逐个接收 (作品信息, 编译文件, 输出路径, 剩余秒数)，反编译后把结果写入输出路径。
+    子进程是守护进程，不能再创建进程池，角色按串行反编译"""
+    metrics.lock, actor_cache.lock = threading.Lock(), threading.Lock()  # fork 时其他线程可能正持有这些锁
+    random.seed()
+    if resource and app.config['ISOLATED_MEMORY_MB'] > 0:  # 以 fork 时继承的地址空间为基准
+        resource.setrlimit(resource.RLIMIT_AS, ((_proc_status_kb('VmSize:') or 0) * 1024 + app.config['ISOLATED_MEMORY_MB'] * 1024 ** 2, resource.getrlimit(resource.RLIMIT_AS)[1]))
+    while True:
+        try: info, payload, path, remaining = conn.recv()
+        except EOFError: return
+        if resource and app.config['ISOLATED_CPU_SECONDS'] > 0:  # RLIMIT_CPU 按进程累计，每个任务在已用时间上加额度
+            u = resource.getrusage(resource.RUSAGE_SELF)
+            resource.setrlimit(resource.RLIMIT_CPU, (int(u.ru_utime + u.ru_stime) + app.config['ISOLATED_CPU_SECONDS'], resource.getrlimit(resource.RLIMIT_CPU)[1]))
+        stats, dl, before = {}, Deadline(remaining), metrics.snapshot()
+        try:
+            with timed(stats, 'parse'): work = json_loads(payload); del payload
+            with timed(stats, 'decompile'):
+                d = KittenDecompiler(info, work, workers=0, deadline=dl) if info["type"] in ("KITTEN4", "KITTEN3", "KITTEN2") else CoCoDecompiler(info, work, dl); out = d.start()
+            with timed(stats, 'serialize'):
+                with open(path, 'wb') as f: f.write(json_dumps_bytes(out, ensure_ascii=False, indent=2, default=json_default))
+            stats.update(actor_count=d.actor_count, block_count=d.block_count); res = ('ok', stats)
+        except MemoryError: res = ('error', f"反编译内存超出限制（{app.config['ISOLATED_MEMORY_MB']} MB）")
+        except DeadlineExceededError as e: res = ('timeout', str(e))
+        except Exception as e: res = ('error', f"{type(e).__name__}: {e}")
+        work = d = out = None; after = metrics.snapshot()
+        conn.send(res + ({k: v - before.get(k, 0) for k, v in after.items() if v != before.get(k, 0)}, _proc_status_kb('VmRSS:')))
+
+
+class IsolatedWorker:
+    def __init__(self):
+        ctx = multiprocessing.get_context('fork'); self.conn, child = ctx.Pipe()
+        self.proc, self.tasks, self.rss_kb = ctx.Process(target=_isolated_main, args=(child,), daemon=True), 0, None
+        self.proc.start(); child.close()
+
+    def kill(self):
+        try: self.proc.kill(); self.proc.join(5)
+        except (OSError, ValueError): pass
+        self.conn.close()
+
+    def crash_reason(self):
+        self.proc.join(5); code = self.proc.exitcode
+        if code == -signal.SIGXCPU: return f"反编译 CPU 时间超出限制（{app.config['ISOLATED_CPU_SECONDS']} 秒）"
+        if code == -signal.SIGKILL: return "反编译进程被系统终止（内存不足）"
+        return f"反编译进程异常退出（{'信号 ' + signal.Signals(-code).name if code and code < 0 else '退出码 ' + str(code)}）"
+
+
+class IsolatedPool:
+    """每个 gunicorn worker 预先 fork 的反编译子进程：按任务限制地址空间与 CPU 时间，处理一定数量的任务或内存过高后重建；
+    子进程崩溃、超时时结束并替换该进程，向调用方抛出 DecompilerError"""
+    def __init__(self, size): self.size, self.idle, self.lock, self.started = size, queue.Queue(), threading.Lock(), False
+
+    def _ensure(self):
+        with self.lock:
+            if not self.started: [self.idle.put(IsolatedWorker()) for _ in range(self.size)]; self.started = True
+
+    def run(self, info, payload, deadline, stats):
+        self._ensure(); deadline.check()
+        try: w = self.idle.get(timeout=deadline.timeout())
+        except queue.Empty: raise DeadlineExceededError("等待反编译进程超时")
+        if not w.proc.is_alive(): w.kill(); w = IsolatedWorker(); metrics.inc('isolated_recycled')  # 空闲时被系统终止
+        fd, path = tempfile.mkstemp(prefix='decompile-', suffix='.json'); os.close(fd); ok = sent = replied = False
+        try:
+            w.tasks += 1; metrics.inc('isolated_tasks')
+            try:
+                remaining = deadline.timeout(); sent = True
+                w.conn.send((info, payload, path, remaining))
+                if not w.conn.poll(deadline.timeout()): metrics.inc('isolated_killed'); raise DeadlineExceededError("反编译超时")
+                status, result, counters, w.rss_kb = w.conn.recv(); replied = True
+            except (EOFError, OSError): metrics.inc('isolated_crashed'); raise IsolatedWorkerCrashError(w.crash_reason())
+            for k, n in counters.items(): metrics.inc(k, n)
+            if status == 'timeout': raise DeadlineExceededError(result)
+            if status != 'ok': metrics.inc('isolated_failed'); raise DecompilerError(result)
+            for k, v in result.pop('phase_ms').items(): stats.setdefault('phase_ms', {})[k] = v
+            stats.update(result); ok = True; return IsolatedOutput(path)
+        finally:
+            if not ok:
+                try: os.remove(path)
+                except OSError: pass
+            self._release(w, healthy=replied or not sent)  # 任务未发出时子进程没用过，不必重建
+
+    def _release(self, w, healthy):
+        recycle = not healthy or w.tasks >= app.config['ISOLATED_MAX_TASKS'] or (w.rss_kb or 0) > app.config['ISOLATED_RECYCLE_MB'] * 1024
+        if recycle: w.kill(); w = IsolatedWorker(); metrics.inc('isolated_recycled')
+        self.idle.put(w)
+
+    def snapshot(self):
+        return {'size': self.size if self.started else 0, 'idle': self.idle.qsize()}
+
+isolated_pool = IsolatedPool(app.config['ISOLATED_WORKERS'])
 
 
 # ==================== 工具函数 ====================
 
+def content_disposition(name):
+    """与 send_file 相同的附件文件名写法：非 ASCII 文件名同时给出 filename*"""
+    try: name.encode('ascii'); return f'attachment; filename="{name}"'
+    except UnicodeEncodeError: return f"attachment; filename=\"{unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')}\"; filename*=UTF-8''{quote(name, safe='!#$&+^`|~')}"
+
+def chunks(seq, n=500):
+    """按 n 个一组切分，IN 查询的参数个数不超过旧版 SQLite 的上限"""
+    return [seq[i:i + n] for i in range(0, len(seq), n)]
+
+def percentile(values, p):
+    """最近秩法百分位，values 需已排序"""
+    return values[max(0, min(len(values) - 1, math.ceil(p / 100 * len(values)) - 1))] if values else None
+
+def search_records(q, text):
+    """按作品名、作者、IP、作品ID搜索记录：SQLite 使用 FTS5 索引，每个词按前缀匹配、多个词同时满足；其他数据库退回 LIKE"""
+    terms = text.split()
+    if records_fts:
+        m = ' '.join('"' + t.replace('"', '""') + '"*' for t in terms)
+        return q.filter(db.text("records.id IN (SELECT rowid FROM records_fts WHERE records_fts MATCH :m)").bindparams(m=m))
+    R = DecompilerRecord
+    for t in terms: q = q.filter(db.or_(R.work_name.like(f"{t}%"), R.author_name.like(f"{t}%"), R.client_ip.like(f"{t}%"), db.cast(R.work_id, db.String).like(f"{t}%")))
+    return q
+
 def get_ip():
     if request.headers.get('X-Forwarded-For'): return request.headers.get('X-Forwarded-For').split(',')[0].strip()
     return request.remote_addr
@@ -1524,13 +2621,364 @@ def admin_required(f):
     return d
 
 
+BULK_MAX_ITEMS = 10000  # 批量操作每次最多处理的条数
+
+def bulk_response(results, **extra):
+    return jsonify({'success': True, 'data': {'results': results, 'summary': dict(Counter(r['status'] for r in results)), **extra}})
+
+def bulk_ban_works(entries, by, unban=False):
+    """entries: [(作品ID, 原因)]，按输入顺序返回每项结果；由调用方提交事务"""
+    wids, out = [], []
+    for raw, _ in entries:
+        try: wid = int(raw)
+        except (TypeError, ValueError): wid = 0
+        wids.append(wid if wid > 0 else None)
+    valid = list(dict.fromkeys(w for w in wids if w))
+    banned = {w for part in chunks(valid) for (w,) in db.session.query(BannedWork.work_id).filter(BannedWork.work_id.in_(part))}
+    if unban:
+        for part in chunks([w for w in valid if w in banned]): BannedWork.query.filter(BannedWork.work_id.in_(part)).delete(synchronize_session=False)
+    seen = set()
+    for (raw, reason), wid in zip(entries, wids):
+        if wid is None: out.append({'item': raw, 'status': 'invalid'}); continue
+        if wid in seen: out.append({'item': wid, 'status': 'duplicate'}); continue
+        seen.add(wid)
+        if unban: out.append({'item': wid, 'status': 'unbanned' if wid in banned else 'not_banned'})
+        elif wid in banned: out.append({'item': wid, 'status': 'already_banned'})
+        else: db.session.add(BannedWork(work_id=wid, reason=reason, banned_by=by)); out.append({'item': wid, 'status': 'banned'})
+    return out
+
+def bulk_ban_ips(entries, by, expires_at=None, unban=False):
+    """entries: [(IP, 原因)]，封禁时校验地址格式，解封时按原样匹配；由调用方提交事务"""
+    def norm(raw):
+        ip = str(raw).strip()
+        if unban: return ip or None
+        try: return str(ipaddress.ip_address(ip))
+        except ValueError: return None
+    ips, out, seen = [norm(raw) for raw, _ in entries], [], set()
+    valid = list(dict.fromkeys(i for i in ips if i))
+    banned = {i for part in chunks(valid) for (i,) in db.session.query(BannedIP.ip_address).filter(BannedIP.ip_address.in_(part))}
+    if unban:
+        for part in chunks([i for i in valid if i in banned]): BannedIP.query.filter(BannedIP.ip_address.in_(part)).delete(synchronize_session=False)
+    for (raw, reason), ip in zip(entries, ips):
+        if ip is None: out.append({'item': raw, 'status': 'invalid'}); continue
+        if ip in seen: out.append({'item': ip, 'status': 'duplicate'}); continue
+        seen.add(ip)
+        if unban: out.append({'item': ip, 'status': 'unbanned' if ip in banned else 'not_banned'})
+        elif ip in banned: out.append({'item': ip, 'status': 'already_banned'})
+        else: db.session.add(BannedIP(ip_address=ip, reason=reason, banned_by=by, expires_at=expires_at)); out.append({'item': ip, 'status': 'banned'})
+    return out
+
+
+# ==================== 采样性能分析 ====================
+
+class SamplingProfiler:
+    """按比例或指定作品ID对反编译过程做 cProfile / tracemalloc 采样，结果写入轮转目录"""
+    def __init__(self, folder, max_files):
+        self.folder, self.max_files, self.lock, self._cache = folder, max_files, threading.Lock(), (None, {})
+        os.makedirs(folder, exist_ok=True)
+
+    @property
+    def settings_path(self): return os.path.join(self.folder, 'settings.json')
+
+    def settings(self):
+        """环境变量为默认值，后台修改写入 settings.json，所有 worker 共享"""
+        s = {'sample_rate': app.config['PROFILE_SAMPLE_RATE'], 'work_ids': [int(x) for x in app.config['PROFILE_WORK_IDS'].split(',') if x.strip().isdigit()], 'memory': app.config['PROFILE_MEMORY']}
+        try: mt = os.path.getmtime(self.settings_path)
+        except OSError: return s
+        if self._cache[0] != mt:
+            try:
+                with open(self.settings_path, encoding='utf-8') as f: self._cache = (mt, json.load(f))
+            except (OSError, ValueError): return s
+        s.update(self._cache[1]); return s
+
+    def update(self, **kw):
+        s = self.settings(); s.update(kw); tmp = f"{self.settings_path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f: json.dump(s, f)
+        os.replace(tmp, self.settings_path); return s
+
+    def should_profile(self, wid):
+        s = self.settings()
+        return wid in s['work_ids'] or (s['sample_rate'] > 0 and random.random() < s['sample_rate'])
+
+    def run(self, wid, rid, fn, *a, **kw):
+        if not self.should_profile(wid): return fn(*a, **kw)
+        prof, mem = cProfile.Profile(), self.settings()['memory'] and not tracemalloc.is_tracing() and self.lock.acquire(blocking=False)
+        try:
+            if mem: tracemalloc.start(10)
+            prof.enable()
+        except ValueError:  # 同一线程已有其他分析器在运行
+            if mem: tracemalloc.stop(); self.lock.release()
+            return fn(*a, **kw)
+        try: return fn(*a, **kw)
+        finally:
+            prof.disable(); base = os.path.join(self.folder, f"{datetime.utcnow().strftime('%Y%m%d%H%M%S')}_{wid}_{rid}")
+            try:
+                prof.dump_stats(f"{base}.prof")
+                if mem:
+                    snap = tracemalloc.take_snapshot(); peak = tracemalloc.get_traced_memory()[1]
+                    with open(f"{base}.mem.txt", 'w', encoding='utf-8') as f:
+                        f.write(f"peak: {peak / 1024:.1f} KiB\n"); f.writelines(f"{st}\n" for st in snap.statistics('lineno')[:50])
+                self._rotate()
+            except OSError as e: print(f"写入性能分析结果失败: {e}")
+            finally:
+                if mem: tracemalloc.stop(); self.lock.release()
+
+    def files(self):
+        fs = [(n, os.stat(os.path.join(self.folder, n))) for n in os.listdir(self.folder) if n.endswith(('.prof', '.mem.txt'))]
+        return sorted(fs, key=lambda x: x[1].st_mtime, reverse=True)
+
+    def _rotate(self):
+        for n, _ in self.files()[self.max_files:]:
+            try: os.remove(os.path.join(self.folder, n))
+            except OSError: pass
+
+profiler = SamplingProfiler(app.config['PROFILE_FOLDER'], app.config['PROFILE_MAX_FILES'])
+
+
+# ==================== 准入控制 ====================
+
+class AdmissionSlot:
+    def __init__(self, admission, fd): self.admission, self.fd, self.started = admission, fd, time.monotonic()
+    def release(self):
+        if self.fd is None: return
+        self.admission._close(self.fd); self.fd = None
+        with self.admission.lock: self.admission.service.append(time.monotonic() - self.started)
+
+
+class Admission:
+    """单机反编译并发上限：ADMISSION_MAX_CONCURRENT 个槽位文件、ADMISSION_QUEUE_SIZE 个排队文件由所有 worker 通过 flock 共享。
+    没有空闲槽位时先占一个排队位置再轮询等待，排队已满或等待超时则拒绝；最后 ADMISSION_RESERVED 个槽位只给后台管理员请求，
+    管理员请求也不占排队位置。复用已有结果的请求不经过准入控制"""
+    NOOP = SimpleNamespace(release=lambda: None)
+
+    def __init__(self, folder):
+        if self.enabled and app.config['ADMISSION_MAX_CONCURRENT'] <= app.config['ADMISSION_RESERVED']:
+            raise RuntimeError("ADMISSION_MAX_CONCURRENT 需大于 ADMISSION_RESERVED，否则普通请求没有可用的槽位")
+        self.folder, self.lock, self.waits, self.service = folder, threading.Lock(), deque(maxlen=200), deque(maxlen=200)
+        self.fds, self.fork_lock = set(), threading.Lock()  # 本进程持有的槽位/排队文件
+        if hasattr(os, 'register_at_fork'): os.register_at_fork(before=self.fork_lock.acquire, after_in_parent=self.fork_lock.release, after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        """角色进程池、隔离进程都是请求持有槽位时 fork 的：子进程继承的文件描述符不关闭，父进程释放后 flock 仍被子进程占着"""
+        for fd in self.fds:
+            try: os.close(fd)
+            except OSError: pass
+        self.fds, self.fork_lock, self.lock = set(), threading.Lock(), threading.Lock()
+
+    @property
+    def enabled(self): return fcntl is not None and app.config['ADMISSION_MAX_CONCURRENT'] > 0
+
+    def _try_lock(self, name):
+        """加锁成功后写入本进程号，供 snapshot 统计占用"""
+        os.makedirs(self.folder, exist_ok=True)
+        with self.fork_lock:
+            fd = os.open(os.path.join(self.folder, name), os.O_RDWR | os.O_CREAT, 0o644)
+            try: fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError: os.close(fd); return None
+            os.ftruncate(fd, 0); os.write(fd, str(os.getpid()).encode()); self.fds.add(fd); return fd
+
+    def _close(self, fd):
+        """先清空进程号再显式解锁、关闭文件。flock 属于打开的文件，刚 fork 的子进程可能还没来得及关闭继承的副本，只关闭不会释放锁"""
+        with self.fork_lock:
+            self.fds.discard(fd)
+            try: os.ftruncate(fd, 0); fcntl.flock(fd, fcntl.LOCK_UN)
+            except OSError: pass
+            os.close(fd)
+
+    def _take(self, prefix, n): return next((fd for fd in (self._try_lock(f"{prefix}-{i}.lock") for i in range(n)) if fd is not None), None)
+
+    def _take_slot(self, priority):
+        n = app.config['ADMISSION_MAX_CONCURRENT']
+        return self._take('slot', n if priority else max(n - app.config['ADMISSION_RESERVED'], 0))  # 保留槽位从不给普通请求
+
+    def retry_after(self):
+        """按本进程近期反编译耗时的中位数估计"""
+        with self.lock: t = percentile(sorted(self.service), 50)
+        return max(1, math.ceil(t)) if t else 5
+
+    def acquire(self, priority=False, deadline=UNLIMITED, wait=True):
+        if not self.enabled: return self.NOOP
+        t0 = time.monotonic(); fd = self._take_slot(priority)
+        if fd is None:
+            if not wait: raise AdmissionRejectedError("没有空闲的反编译槽位")
+            ticket = None if priority else self._take('queue', app.config['ADMISSION_QUEUE_SIZE'])
+            if ticket is None and not priority: metrics.inc('admission_rejected_full'); raise AdmissionRejectedError("服务繁忙，请稍后重试", self.retry_after())
+            try:
+                until = t0 + min(app.config['ADMISSION_QUEUE_TIMEOUT'], max(deadline.remaining() - 1, 0))
+                while fd is None and time.monotonic() < until: time.sleep(random.uniform(0.01, 0.03) if priority else random.uniform(0.03, 0.07)); fd = self._take_slot(priority)
+            finally:
+                if ticket is not None: self._close(ticket)
+            if fd is None: metrics.inc('admission_rejected_timeout'); raise AdmissionRejectedError("排队等待超时，请稍后重试", self.retry_after())
+        wait_ms = (time.monotonic() - t0) * 1000; metrics.inc('admission_admitted'); metrics.inc('admission_wait_ms', round(wait_ms))
+        if priority: metrics.inc('admission_priority')
+        with self.lock: self.waits.append(wait_ms)
+        return AdmissionSlot(self, fd)
+
+    def _held(self, prefix, n):
+        """按锁文件里持有者写入的进程号统计占用数（所有 worker 合计）。只读不加锁，避免探测时抢走请求要用的槽位；
+        持有者异常退出留下的进程号已不存在，不计入"""
+        busy = 0
+        for i in range(n):
+            try:
+                with open(os.path.join(self.folder, f"{prefix}-{i}.lock"), encoding='ascii') as f: pid = int(f.read().strip() or 0)
+            except (OSError, ValueError): continue
+            if pid <= 0: continue
+            try: os.kill(pid, 0); busy += 1
+            except PermissionError: busy += 1
+            except OSError: pass
+        return busy
+
+    def snapshot(self):
+        if not self.enabled: return {'enabled': False}
+        with self.lock: w = sorted(self.waits)
+        return {'enabled': True, 'pid': os.getpid(), 'limit': app.config['ADMISSION_MAX_CONCURRENT'], 'reserved': app.config['ADMISSION_RESERVED'], 'queue_size': app.config['ADMISSION_QUEUE_SIZE'],
+                'active': self._held('slot', app.config['ADMISSION_MAX_CONCURRENT']), 'queued': self._held('queue', app.config['ADMISSION_QUEUE_SIZE']),
+                'wait_ms': {k: round(v, 1) if v is not None else None for k, v in (('p50', percentile(w, 50)), ('p95', percentile(w, 95)), ('max', w[-1] if w else None))}, 'retry_after': self.retry_after()}
+
+admission = Admission(app.config['ADMISSION_LOCK_DIR'])
+
+
+# ==================== 热门作品预热 ====================
+
+WARMER_IP = 'warmer'  # 预热产生的记录的 client_ip
+
+def _proc_status_kb(field):
+    try:
+        with open('/proc/self/status', encoding='ascii') as f: return next((int(l.split()[1]) for l in f if l.startswith(field)), None)
+    except OSError: return None
+
+def mem_probe_start():
+    """重置进程内存峰值 VmHWM 并返回当前占用（KB）；非 Linux 返回 None。同一进程内多个线程同时反编译时结果为近似值"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f: f.write('5')
+    except OSError: return None
+    return _proc_status_kb('VmRSS:')
+
+def mem_probe_end(rss0):
+    hwm = _proc_status_kb('VmHWM:') if rss0 is not None else None
+    return max(hwm - rss0, 0) if hwm is not None else None
+
+def write_output(src, f):
+    if not isinstance(src, IsolatedOutput): return json_dump(src, f, ensure_ascii=False, indent=2, default=json_default)
+    with open(src.path, 'rb') as g:
+        if hasattr(f, 'buffer'): f.flush(); shutil.copyfileobj(g, f.buffer, 1024 * 1024)
+        else: f.write(g.read().decode('utf-8'))
+
+def decompile_to_record(rec, wid, deadline):
+    """反编译作品并把结果和性能数据写入记录（用户请求与后台预热共用）；失败时只写性能数据，由调用方设置状态并提交"""
+    stats, t0, rss0 = {}, time.perf_counter(), mem_probe_start()
+    try:
+        info, src = profiler.run(wid, rec.id, Decompiler.decompile, wid, deadline, stats); deadline.check()
+        rec.work_name, rec.work_type, rec.author_name = info['name'], info['type'], info['author_name']
+        ext = {"KITTEN4": ".bcm4", "KITTEN3": ".bcm", "COCO": ".json"}.get(info['type'], ".json")
+        try:
+            with timed(stats, 'write'): fp, fs = output_store.write(wid, rec.id, ext, lambda f: write_output(src, f))
+        finally:
+            if isinstance(src, IsolatedOutput): src.discard()
+        rec.file_path, rec.file_size, rec.status = fp, fs, 'success'
+        rec.expires_at = datetime.utcnow() + timedelta(minutes=app.config['FILE_EXPIRE_MINUTES'])
+    finally:
+        rec.duration_ms, rec.phase_ms = round((time.perf_counter() - t0) * 1000), json_dumps(stats.get('phase_ms', {}))
+        rec.payload_bytes, rec.block_count, rec.actor_count = stats.get('payload_bytes'), stats.get('block_count'), stats.get('actor_count')
+        rec.mem_peak_kb = mem_probe_end(rss0)
+    db.session.commit(); output_store.enforce(keep=rec.id, min_interval=app.config['OUTPUT_ENFORCE_INTERVAL'])
+
+def output_data(rec):
+    return {'record_id': rec.id, 'work_id': rec.work_id, 'work_name': rec.work_name, 'work_type': rec.work_type, 'author_name': rec.author_name, 'file_size': rec.file_size, 'download_url': f"/api/download/{rec.id}", 'expires_at': rec.expires_at.isoformat()}
+
+def fresh_output(wid, min_minutes=0):
+    """作品最新的、剩余有效期不少于 min_minutes 分钟的成功结果"""
+    R = DecompilerRecord
+    return R.query.filter(R.work_id == wid, R.status == 'success', R.file_path.isnot(None), R.expires_at > datetime.utcnow() + timedelta(minutes=min_minutes)).order_by(R.expires_at.desc()).first()
+
+
+class Warmer:
+    """在热门作品的结果过期前于后台重新反编译，让下一个访问者直接复用；多个 worker 通过文件锁选出一个负责预热"""
+    FAILURE_BACKOFF = 3600  # 预热失败的作品一小时内不再尝试
+
+    def __init__(self, lock_path):
+        self.lock_path, self.fd, self.lock, self.running, self.failed, self.last_run = lock_path, None, threading.Lock(), set(), {}, None
+
+    def is_leader(self):
+        """非阻塞地获取文件锁并一直持有，持有者退出后由其他 worker 在下一轮接手"""
+        if self.fd is not None: return True
+        if fcntl is None: self.fd = -1; return True
+        os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try: fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError: os.close(fd); return False
+        os.ftruncate(fd, 0); os.write(fd, str(os.getpid()).encode()); self.fd = fd; return True
+
+    def leader_pid(self):
+        try:
+            with open(self.lock_path, encoding='utf-8') as f: return int(f.read().strip() or 0) or None
+        except (OSError, ValueError): return None
+
+    def budget_used(self):
+        R = DecompilerRecord
+        return R.query.filter(R.client_ip == WARMER_IP, R.created_at >= datetime.utcnow() - timedelta(hours=1)).count()
+
+    def plan(self):
+        """近期请求数 + 下载数最高的作品及其当前结果；预热自身的请求不计入，被封禁的作品不预热"""
+        R, now = DecompilerRecord, datetime.utcnow()
+        reqs, dls = func.sum(case((R.client_ip != WARMER_IP, 1), else_=0)), func.coalesce(func.sum(R.download_count), 0)
+        score = (reqs + dls).label('score')
+        rows = db.session.query(R.work_id, func.max(R.work_name), reqs, dls, score).filter(R.created_at >= now - timedelta(hours=app.config['WARM_WINDOW_HOURS']), R.status.in_(('success', 'cached')), R.work_id.notin_(db.select(BannedWork.work_id))).group_by(R.work_id).having(score > 0).order_by(score.desc(), R.work_id).limit(app.config['WARM_TOP_N']).all()
+        out = []
+        for wid, name, r, d, sc in rows:
+            cur, failed = fresh_output(wid), self.failed.get(wid, 0) > time.time() - self.FAILURE_BACKOFF
+            out.append({'work_id': wid, 'work_name': name, 'requests': int(r), 'downloads': int(d), 'score': int(sc), 'record_id': cur.id if cur else None, 'expires_at': cur.expires_at.isoformat() if cur else None, 'warmed': bool(cur and cur.client_ip == WARMER_IP), 'running': wid in self.running, 'backoff': failed, 'due': not failed and (not cur or cur.expires_at < now + timedelta(minutes=app.config['WARM_LEAD_MINUTES']))})
+        return out
+
+    def tick(self, pool):
+        slots = min(app.config['WARM_CONCURRENCY'] - len(self.running), app.config['WARM_HOURLY_BUDGET'] - self.budget_used())
+        for w in [w for w in self.plan() if w['due'] and not w['running']][:max(slots, 0)]:
+            if upstream.in_flight >= upstream.limit * app.config['WARM_UPSTREAM_SHARE']: metrics.inc('warm_deferred'); break  # 给用户请求让路
+            with self.lock: self.running.add(w['work_id'])
+            pool.submit(self._warm, w['work_id'])
+        self.last_run = datetime.utcnow()
+
+    def _warm(self, wid):
+        try:
+            slot = admission.acquire(wait=False)  # 只用非保留槽位且不排队，给用户请求让路
+        except AdmissionRejectedError:
+            metrics.inc('warm_deferred')
+            with self.lock: self.running.discard(wid)
+            return
+        try:
+            with app.app_context():
+                rec = DecompilerRecord(work_id=wid, client_ip=WARMER_IP, status='pending'); db.session.add(rec); db.session.commit()
+                try: decompile_to_record(rec, wid, Deadline(app.config['DECOMPILE_DEADLINE'])); metrics.inc('warm_success'); self.failed.pop(wid, None)
+                except Exception as e:
+                    rec.status = 'not_found' if isinstance(e, WorkNotFoundError) else 'timeout' if isinstance(e, DeadlineExceededError) else 'error'
+                    rec.error_message = str(e); db.session.commit(); metrics.inc('warm_failed'); self.failed[wid] = time.time()
+                    print(f"预热作品 {wid} 失败: {e}")
+        finally:
+            slot.release()
+            with self.lock: self.running.discard(wid)
+
+    def loop(self):
+        pool = ThreadPoolExecutor(max(app.config['WARM_CONCURRENCY'], 1), thread_name_prefix='warmer')
+        while True:
+            try:
+                if self.is_leader():
+                    with app.app_context(): self.tick(pool)
+            except Exception as e: print(f"预热热门作品时出错: {e}")
+            time.sleep(app.config['WARM_INTERVAL'])
+
+    def snapshot(self):
+        return {'enabled': app.config['WARM_ENABLED'], 'pid': os.getpid(), 'leader_pid': self.leader_pid() if fcntl else None, 'last_run': self.last_run.isoformat() if self.last_run else None, 'budget': {'hourly': app.config['WARM_HOURLY_BUDGET'], 'used': self.budget_used()}, 'concurrency': app.config['WARM_CONCURRENCY'], 'works': self.plan()}
+
+warmer = Warmer(app.config['WARM_LOCK_FILE'])
+
+
 # ==================== 路由 ====================
 
 @app.route('/')
-def index(): return INDEX_HTML
+def index(): return INDEX_PAGE.response()
 
 @app.route('/admin')
-def admin_page(): return ADMIN_HTML
+def admin_page(): return ADMIN_PAGE.response()
 
 @app.route('/api/decompile', methods=['POST'])
 def api_decompile():
@@ -1541,22 +2989,36 @@ def api_decompile():
     if wid <= 0: return jsonify({'success': False, 'error': '作品ID无效'}), 400
     ip = get_ip(); banned, reason = check_banned(ip, wid)
     if banned: return jsonify({'success': False, 'error': reason}), 403
-    rec = DecompilerRecord(work_id=wid, client_ip=ip, status='pending'); db.session.add(rec); db.session.commit()
+    neg = negative_cache.get(wid)  # 近期确认不存在或不支持的作品直接拒绝，不请求上游也不再写入记录
+    if neg: return jsonify({'success': False, 'error': neg['error']}), 404 if neg['kind'] == 'not_found' else 400
+    hit = fresh_output(wid, app.config['OUTPUT_REUSE_MIN_MINUTES']) if app.config['OUTPUT_REUSE'] else None
+    if hit:
+        db.session.add(DecompilerRecord(work_id=wid, client_ip=ip, status='cached', work_name=hit.work_name, work_type=hit.work_type, author_name=hit.author_name, file_size=hit.file_size)); db.session.commit(); metrics.inc('output_reused')
+        return jsonify({'success': True, 'data': output_data(hit)})
+    dl, slot = Deadline(app.config['DECOMPILE_DEADLINE']), Admission.NOOP  # 排队时间也计入预算
     try:
-        info, src = Decompiler.decompile(wid)
-        ext = {"KITTEN4": ".bcm4", "KITTEN3": ".bcm", "COCO": ".json"}.get(info['type'], ".json")
-        fp = os.path.join(app.config['UPLOAD_FOLDER'], f"{wid}_{rec.id}{ext}")
-        with open(fp, 'w', encoding='utf-8') as f: json.dump(src, f, ensure_ascii=False, indent=2)
-        fs = os.path.getsize(fp); exp = datetime.utcnow() + timedelta(minutes=app.config['FILE_EXPIRE_MINUTES'])
-        rec.work_name, rec.work_type, rec.author_name, rec.file_path, rec.file_size, rec.status, rec.expires_at = info['name'], info['type'], info['author_name'], fp, fs, 'success', exp
-        db.session.commit()
-        return jsonify({'success': True, 'data': {'record_id': rec.id, 'work_id': wid, 'work_name': info['name'], 'work_type': info['type'], 'author_name': info['author_name'], 'file_size': fs, 'download_url': f"/api/download/{rec.id}", 'expires_at': exp.isoformat()}})
-    except WorkNotFoundError:
-        rec.status, rec.error_message = 'not_found', f'作品不存在: {wid}'; db.session.commit()
-        return jsonify({'success': False, 'error': f'作品不存在: {wid}'}), 404
-    except Exception as e:
-        rec.status, rec.error_message = 'error', str(e); db.session.commit()
-        return jsonify({'success': False, 'error': str(e)}), 500
+        try: slot = admission.acquire(priority=bool(session.get('admin_id')), deadline=dl)
+        except AdmissionRejectedError as e: return jsonify({'success': False, 'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
+        rec = DecompilerRecord(work_id=wid, client_ip=ip, status='pending'); db.session.add(rec); db.session.commit()
+        try:
+            decompile_to_record(rec, wid, dl)
+            return jsonify({'success': True, 'data': output_data(rec)})
+        except WorkNotFoundError:
+            rec.status, rec.error_message = 'not_found', f'作品不存在: {wid}'; db.session.commit()
+            return jsonify({'success': False, 'error': f'作品不存在: {wid}'}), 404
+        except UnsupportedWorkTypeError as e:
+            rec.status, rec.error_message = 'error', str(e); db.session.commit()
+            return jsonify({'success': False, 'error': str(e)}), 400
+        except UpstreamUnavailableError as e:
+            rec.status, rec.error_message = 'error', str(e); db.session.commit()
+            return jsonify({'success': False, 'error': str(e)}), 503, {'Retry-After': str(e.retry_after)}
+        except DeadlineExceededError as e:
+            rec.status, rec.error_message = 'timeout', f"{e}（超过 {app.config['DECOMPILE_DEADLINE']:g} 秒）"; db.session.commit(); metrics.inc('decompile_timeout')
+            return jsonify({'success': False, 'error': rec.error_message}), 504
+        except Exception as e:
+            rec.status, rec.error_message = 'error', str(e); db.session.commit()
+            return jsonify({'success': False, 'error': str(e)}), 500
+    finally: slot.release()
 
 @app.route('/api/records')
 def api_records():
@@ -1569,26 +3031,22 @@ def api_download(rid):
     rec = DecompilerRecord.query.get(rid)
     if not rec: return jsonify({'success': False, 'error': '记录不存在'}), 404
     if rec.status != 'success': return jsonify({'success': False, 'error': f'文件不可用: {rec.status}'}), 400
-    if not rec.file_path or not os.path.exists(rec.file_path): return jsonify({'success': False, 'error': '文件已过期'}), 404
+    if not rec.file_path or not output_store.exists(rec.file_path): return jsonify({'success': False, 'error': '文件已过期'}), 404
     if rec.expires_at and rec.expires_at < datetime.utcnow():
-        try: os.remove(rec.file_path)
-        except: pass
+        output_store.remove(rec.file_path)
         rec.file_path = None; db.session.commit()
         return jsonify({'success': False, 'error': '文件已过期'}), 410
-    rec.download_count += 1; db.session.commit()
+    # 断点续传的后续分段不重复计数
+    rg = request.range
+    if not rg or rg.ranges[0][0] == 0: rec.download_count += 1; db.session.commit()
     
     # 动态确定文件名和MIME类型
     filename = f"{rec.work_name or rec.work_id}"
     # 过滤掉文件名中的非法字符
     filename = "".join(c for c in filename if c.isalnum() or c in (' ', '.', '_')).strip()
     ext = os.path.splitext(rec.file_path)[1]
-    
-    return send_file(
-        rec.file_path, 
-        as_attachment=True, 
-        download_name=f"{filename}{ext}",
-        mimetype='application/json' if ext == '.json' else 'application/octet-stream'
-    )
+    mimetype = 'application/json' if ext == '.json' else 'application/octet-stream'
+    return output_store.send(rec.file_path, f"{filename}{ext}", mimetype)
 
 @app.route('/api/admin/login', methods=['POST'])
 def admin_login():
@@ -1605,7 +3063,7 @@ def admin_logout(): session.pop('admin_id', None); return jsonify({'success': Tr
 @app.route('/api/admin/stats')
 @admin_required
 def admin_stats():
-    return jsonify({'success': True, 'data': {'total_records': DecompilerRecord.query.count(), 'success_records': DecompilerRecord.query.filter_by(status='success').count(), 'today_records': DecompilerRecord.query.filter(DecompilerRecord.created_at >= datetime.utcnow().replace(hour=0, minute=0, second=0)).count(), 'banned_works': BannedWork.query.count(), 'banned_ips': BannedIP.query.count()}})
+    return jsonify({'success': True, 'data': {'total_records': DecompilerRecord.query.count(), 'success_records': DecompilerRecord.query.filter_by(status='success').count(), 'today_records': DecompilerRecord.query.filter(DecompilerRecord.created_at >= datetime.utcnow().replace(hour=0, minute=0, second=0)).count(), 'banned_works': BannedWork.query.count(), 'banned_ips': BannedIP.query.count(), 'output_storage': output_store.usage()}})
 
 @app.route('/api/admin/records')
 @admin_required
@@ -1614,6 +3072,7 @@ def admin_records():
     q = DecompilerRecord.query
     if request.args.get('status'): q = q.filter_by(status=request.args['status'])
     if request.args.get('work_id'): q = q.filter_by(work_id=int(request.args['work_id']))
+    if request.args.get('q', '').strip(): q = search_records(q, request.args['q'])
     recs = q.order_by(DecompilerRecord.created_at.desc()).paginate(page=page, per_page=per, error_out=False)
     return jsonify({'success': True, 'data': {'records': [r.to_dict() for r in recs.items], 'total': recs.total, 'page': page, 'per_page': per, 'pages': recs.pages}})
 
@@ -1622,10 +3081,36 @@ def admin_records():
 def admin_del_record(rid):
     rec = DecompilerRecord.query.get(rid)
     if not rec: return jsonify({'success': False, 'error': '记录不存在'}), 404
-    if rec.file_path and os.path.exists(rec.file_path): os.remove(rec.file_path)
+    if rec.file_path: output_store.remove(rec.file_path)
     db.session.delete(rec); db.session.commit()
     return jsonify({'success': True})
 
+@app.route('/api/admin/records/bulk-delete', methods=['POST'])
+@admin_required
+def admin_bulk_del_records():
+    """按ID列表和/或筛选条件（status / work_id / client_ip / q / before）删除记录，一次提交后批量删除文件；每次最多 BULK_MAX_ITEMS 条"""
+    d, R = request.get_json() or {}, DecompilerRecord; q, ids = R.query, None
+    f = {k: str(d[k]).strip() if d.get(k) is not None else '' for k in ('status', 'work_id', 'client_ip', 'before', 'q')}  # 只含空白的条件视为未提供
+    items = d.get('ids')
+    if items is not None and not isinstance(items, list): return jsonify({'success': False, 'error': '请提供记录ID列表'}), 400
+    if items is not None and len(items) > BULK_MAX_ITEMS: return jsonify({'success': False, 'error': f'一次最多 {BULK_MAX_ITEMS} 条'}), 400
+    try:
+        if items is not None: ids = [int(x) for x in items]; q = q.filter(R.id.in_(ids))
+        if f['status']: q = q.filter_by(status=f['status'])
+        if f['work_id']: q = q.filter_by(work_id=int(f['work_id']))
+        if f['client_ip']: q = q.filter_by(client_ip=f['client_ip'])
+        if f['before']: q = q.filter(R.created_at < datetime.fromisoformat(f['before']))
+    except (TypeError, ValueError): return jsonify({'success': False, 'error': '参数格式错误'}), 400
+    if f['q']: q = search_records(q, f['q'])
+    if ids is None and not any(f.values()): return jsonify({'success': False, 'error': '请至少提供一个筛选条件'}), 400
+    rows = q.with_entities(R.id, R.file_path).order_by(R.id).limit(BULK_MAX_ITEMS).all()
+    for part in chunks([r.id for r in rows]): R.query.filter(R.id.in_(part)).delete(synchronize_session=False)
+    db.session.commit()
+    failed = set(output_store.remove_many([r.file_path for r in rows if r.file_path]))
+    found = {r.id for r in rows}
+    results = [{'item': r.id, 'status': 'file_error' if r.file_path in failed else 'deleted'} for r in rows] + [{'item': i, 'status': 'not_found'} for i in dict.fromkeys(ids or []) if i not in found]
+    return bulk_response(results, remaining=q.order_by(None).count() if ids is None else 0)
+
 @app.route('/api/admin/banned-works')
 @admin_required
 def admin_banned_works():
@@ -1642,6 +3127,17 @@ def admin_add_banned_work():
     db.session.add(BannedWork(work_id=d['work_id'], work_name=d.get('work_name'), reason=d.get('reason'), banned_by=request.admin.username)); db.session.commit()
     return jsonify({'success': True})
 
+@app.route('/api/admin/banned-works/bulk', methods=['POST'])
+@admin_required
+def admin_bulk_banned_works():
+    """{work_ids: [...], reason, action: ban / unban}"""
+    d = request.get_json() or {}; items = d.get('work_ids')
+    if d.get('action', 'ban') not in ('ban', 'unban'): return jsonify({'success': False, 'error': '未知的操作'}), 400
+    if not isinstance(items, list) or not items: return jsonify({'success': False, 'error': '请提供作品ID列表'}), 400
+    if len(items) > BULK_MAX_ITEMS: return jsonify({'success': False, 'error': f'一次最多 {BULK_MAX_ITEMS} 条'}), 400
+    results = bulk_ban_works([(x, d.get('reason')) for x in items], request.admin.username, unban=d.get('action') == 'unban'); db.session.commit()
+    return bulk_response(results)
+
 @app.route('/api/admin/banned-works/<int:wid>', methods=['DELETE'])
 @admin_required
 def admin_del_banned_work(wid):
@@ -1667,6 +3163,44 @@ def admin_add_banned_ip():
     db.session.add(BannedIP(ip_address=d['ip_address'], reason=d.get('reason'), banned_by=request.admin.username, expires_at=exp)); db.session.commit()
     return jsonify({'success': True})
 
+@app.route('/api/admin/banned-ips/bulk', methods=['POST'])
+@admin_required
+def admin_bulk_banned_ips():
+    """{ips: [...], reason, duration_hours, action: ban / unban}"""
+    d = request.get_json() or {}; items = d.get('ips')
+    if d.get('action', 'ban') not in ('ban', 'unban'): return jsonify({'success': False, 'error': '未知的操作'}), 400
+    if not isinstance(items, list) or not items: return jsonify({'success': False, 'error': '请提供IP地址列表'}), 400
+    if len(items) > BULK_MAX_ITEMS: return jsonify({'success': False, 'error': f'一次最多 {BULK_MAX_ITEMS} 条'}), 400
+    try: exp = datetime.utcnow() + timedelta(hours=float(d['duration_hours'])) if d.get('duration_hours') else None
+    except (TypeError, ValueError): return jsonify({'success': False, 'error': '参数格式错误'}), 400
+    results = bulk_ban_ips([(x, d.get('reason')) for x in items], request.admin.username, exp, unban=d.get('action') == 'unban'); db.session.commit()
+    return bulk_response(results)
+
+@app.route('/api/admin/bans/import', methods=['POST'])
+@admin_required
+def admin_import_bans():
+    """上传封禁列表文件：每行一个作品ID或IP地址，可在逗号、制表符或空格后写原因，# 开头为注释；作品与IP在同一事务中写入"""
+    f = request.files.get('file')
+    if not f: return jsonify({'success': False, 'error': '请上传文件'}), 400
+    cap = BULK_MAX_ITEMS * 200; raw = f.read(cap + 1)
+    if len(raw) > cap: return jsonify({'success': False, 'error': f'文件过大，最多 {cap // 1024} KB'}), 400
+    try: text = raw.decode('utf-8-sig')
+    except UnicodeDecodeError: return jsonify({'success': False, 'error': '文件需为 UTF-8 编码'}), 400
+    try: exp = datetime.utcnow() + timedelta(hours=float(request.form['duration_hours'])) if request.form.get('duration_hours') else None
+    except ValueError: return jsonify({'success': False, 'error': '参数格式错误'}), 400
+    works, ips = [], []
+    for n, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith('#'): continue
+        item, reason = (re.split(r'[,\s]+', line, maxsplit=1) + [''])[:2]
+        (works if item.isdigit() else ips).append((n, item, reason.strip() or request.form.get('reason') or None))
+    if len(works) + len(ips) > BULK_MAX_ITEMS: return jsonify({'success': False, 'error': f'一次最多 {BULK_MAX_ITEMS} 条'}), 400
+    by = request.admin.username
+    results = [{'line': n, 'kind': 'work', **r} for (n, _, _), r in zip(works, bulk_ban_works([(i, r) for _, i, r in works], by))]
+    results += [{'line': n, 'kind': 'ip', **r} for (n, _, _), r in zip(ips, bulk_ban_ips([(i, r) for _, i, r in ips], by, exp))]
+    db.session.commit()
+    return bulk_response(sorted(results, key=lambda r: r['line']))
+
 @app.route('/api/admin/banned-ips/<ip>', methods=['DELETE'])
 @admin_required
 def admin_del_banned_ip(ip):
@@ -1675,6 +3209,76 @@ def admin_del_banned_ip(ip):
     db.session.delete(i); db.session.commit()
     return jsonify({'success': True})
 
+@app.route('/api/admin/metrics')
+@admin_required
+def admin_metrics():
+    c = metrics.snapshot(); lookups = c.get('actor_cache_hit', 0) + c.get('actor_cache_miss', 0)
+    return jsonify({'success': True, 'data': {'pid': os.getpid(), 'counters': c, 'cache_entries': dict(db.session.query(CacheEntry.kind, db.func.count()).group_by(CacheEntry.kind).all()), 'payload_cache': payload_cache.summary(), 'actor_cache': {**actor_cache.summary(), 'hit_rate': round(c.get('actor_cache_hit', 0) / lookups, 4) if lookups else None}, 'isolated': isolated_pool.snapshot()}})
+
+@app.route('/api/admin/analytics')
+@admin_required
+def admin_analytics():
+    """近 hours 小时内最慢、编译文件最大、内存增长最多的作品（每个作品取最差一次），以及按作品类型的百分位统计"""
+    hours, limit, R = min(request.args.get('hours', 24, type=float), 24 * 30), min(request.args.get('limit', 10, type=int), 100), DecompilerRecord
+    recent = (R.created_at >= datetime.utcnow() - timedelta(hours=hours), R.duration_ms.isnot(None))
+    fields = ('duration_ms', 'payload_bytes', 'file_size', 'block_count', 'actor_count', 'mem_peak_kb')
+    def top(key):
+        """每个作品按 key 取最差的一次（窗口函数），排序和截取都在数据库里完成"""
+        col = getattr(R, key); rn = func.row_number().over(partition_by=R.work_id, order_by=(col.desc(), R.id)).label('rn')
+        sub = db.session.query(R.id.label('id'), rn).filter(*recent, col.isnot(None)).subquery()
+        rows = db.session.query(R.id, R.work_id, R.work_name, R.work_type, R.status, R.created_at, R.phase_ms, *(getattr(R, f) for f in fields)).join(sub, R.id == sub.c.id).filter(sub.c.rn == 1).order_by(col.desc(), R.id).limit(limit)
+        return [{'record_id': r.id, 'work_id': r.work_id, 'work_name': r.work_name, 'work_type': r.work_type, 'status': r.status, 'created_at': r.created_at.isoformat(), **{f: getattr(r, f) for f in fields}, 'phase_ms': json_loads(r.phase_ms) if r.phase_ms else {}} for r in rows]
+    by_type, total = {}, 0  # 百分位只需要数值列，逐批读取，不构造 ORM 对象
+    for r in db.session.execute(db.select(R.work_type, R.status, *(getattr(R, f) for f in fields)).filter(*recent).execution_options(yield_per=5000)):
+        t = by_type.setdefault(r[0] or 'unknown', {'count': 0, 'failed': 0, **{f: [] for f in fields}}); t['count'] += 1; t['failed'] += r[1] != 'success'; total += 1
+        for f, v in zip(fields, r[2:]):
+            if v is not None: t[f].append(v)
+    def dist(v):
+        v.sort(); return {'p50': percentile(v, 50), 'p95': percentile(v, 95), 'p99': percentile(v, 99), 'max': v[-1] if v else None}
+    summary = {k: {'count': t['count'], 'failed': t['failed'], **{f: dist(t[f]) for f in fields}} for k, t in sorted(by_type.items())}
+    return jsonify({'success': True, 'data': {'hours': hours, 'records': total, 'by_type': summary, 'slowest': top('duration_ms'), 'largest': top('payload_bytes'), 'memory': top('mem_peak_kb')}})
+
+@app.route('/api/admin/upstream')
+@admin_required
+def admin_upstream(): return jsonify({'success': True, 'data': {'pid': os.getpid(), **upstream.snapshot()}})
+
+@app.route('/api/admin/admission')
+@admin_required
+def admin_admission(): return jsonify({'success': True, 'data': admission.snapshot()})
+
+@app.route('/api/admin/warmer')
+@admin_required
+def admin_warmer(): return jsonify({'success': True, 'data': warmer.snapshot()})
+
+@app.route('/api/admin/cache', methods=['DELETE'])
+@admin_required
+def admin_purge_cache():
+    kind = request.args.get('kind')
+    if kind and kind not in ('info', 'url', 'negative'): return jsonify({'success': False, 'error': '未知的缓存类型'}), 400
+    return jsonify({'success': True, 'data': {'deleted': TTLCache.purge(kind, request.args.get('work_id', type=int))}})
+
+@app.route('/api/admin/profiler')
+@admin_required
+def admin_profiler():
+    return jsonify({'success': True, 'data': {'settings': profiler.settings(), 'files': [{'name': n, 'size': st.st_size, 'created_at': datetime.utcfromtimestamp(st.st_mtime).isoformat()} for n, st in profiler.files()]}})
+
+@app.route('/api/admin/profiler', methods=['POST'])
+@admin_required
+def admin_update_profiler():
+    d = request.get_json() or {}; kw = {}
+    try:
+        if 'sample_rate' in d: kw['sample_rate'] = min(max(float(d['sample_rate']), 0.0), 1.0)
+        if 'work_ids' in d: kw['work_ids'] = [int(x) for x in d['work_ids']]
+        if 'memory' in d: kw['memory'] = bool(d['memory'])
+    except (TypeError, ValueError): return jsonify({'success': False, 'error': '参数格式错误'}), 400
+    return jsonify({'success': True, 'data': {'settings': profiler.update(**kw)}})
+
+@app.route('/api/admin/profiler/files/<name>')
+@admin_required
+def admin_profiler_file(name):
+    if not name.endswith(('.prof', '.mem.txt')): return jsonify({'success': False, 'error': '文件不存在'}), 404
+    return send_from_directory(os.path.abspath(profiler.folder), name, as_attachment=True)
+
 @app.route('/api/admin/change-password', methods=['POST'])
 @admin_required
 def admin_change_password():
@@ -1693,6 +3297,34 @@ def admin_change_password():
 
 # ==================== 初始化 ====================
 
+def migrate_schema():
+    """为已存在的数据表补充新增的列（db.create_all 不会修改已有表）"""
+    insp = sa_inspect(db.engine)
+    for t in db.metadata.sorted_tables:
+        if not insp.has_table(t.name): continue
+        have = {c['name'] for c in insp.get_columns(t.name)}
+        for col in t.columns:
+            if col.name not in have: db.session.execute(db.text(f'ALTER TABLE {t.name} ADD COLUMN {col.name} {col.type.compile(db.engine.dialect)}'))
+    db.session.commit()
+
+records_fts = False  # records_fts 全文索引是否可用（仅 SQLite）
+
+def setup_records_fts():
+    """为 records 建立 FTS5 外部内容索引，由触发器在插入、删除及相关列更新时同步；首次创建时为已有记录建立索引"""
+    global records_fts
+    if db.engine.dialect.name != 'sqlite': return
+    cols = 'work_name, author_name, client_ip, work_id'; new, old = ', '.join(f'new.{c}' for c in cols.split(', ')), ', '.join(f'old.{c}' for c in cols.split(', '))
+    try:
+        created = not db.session.execute(db.text("SELECT 1 FROM sqlite_master WHERE name = 'records_fts'")).first()
+        for sql in (f"CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5({cols}, content='records', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')",
+                    f"CREATE TRIGGER IF NOT EXISTS records_fts_ai AFTER INSERT ON records BEGIN INSERT INTO records_fts(rowid, {cols}) VALUES (new.id, {new}); END",
+                    f"CREATE TRIGGER IF NOT EXISTS records_fts_ad AFTER DELETE ON records BEGIN INSERT INTO records_fts(records_fts, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+                    f"CREATE TRIGGER IF NOT EXISTS records_fts_au AFTER UPDATE OF {cols} ON records BEGIN INSERT INTO records_fts(records_fts, rowid, {cols}) VALUES ('delete', old.id, {old}); INSERT INTO records_fts(rowid, {cols}) VALUES (new.id, {new}); END"):
+            db.session.execute(db.text(sql))
+        if created: db.session.execute(db.text("INSERT INTO records_fts(records_fts) VALUES ('rebuild')"))
+        db.session.commit(); records_fts = True
+    except SQLAlchemyError as e: db.session.rollback(); print(f"全文索引不可用，记录搜索使用 LIKE: {e}")
+
 def cleanup_expired_files():
     """定时清理过期文件"""
     while True:
@@ -1700,17 +3332,15 @@ def cleanup_expired_files():
             with app.app_context():
                 expired = DecompilerRecord.query.filter(DecompilerRecord.expires_at < datetime.utcnow(), DecompilerRecord.file_path.isnot(None)).all()
                 for rec in expired:
-                    if rec.file_path and os.path.exists(rec.file_path):
-                        try: os.remove(rec.file_path)
-                        except: pass
-                    rec.file_path = None
+                    output_store.remove(rec.file_path); rec.file_path = None
                 db.session.commit()
                 if expired: print(f"[{datetime.now()}] 已清理 {len(expired)} 个过期文件")
+                output_store.enforce()
         except Exception as e: print(f"清理文件时出错: {e}")
         time.sleep(600)  # 每10分钟检查一次
 
 with app.app_context():
-    db.create_all()
+    db.create_all(); migrate_schema(); setup_records_fts()
     existing_admin = AdminUser.query.filter_by(username=app.config['ADMIN_USERNAME']).first()
     if existing_admin:
         existing_admin.set_password(app.config['ADMIN_PASSWORD'])
@@ -1723,6 +3353,7 @@ with app.app_context():
     # 启动清理线程
     cleanup_thread = threading.Thread(target=cleanup_expired_files, daemon=True)
     cleanup_thread.start()
+    if app.config['WARM_ENABLED']: threading.Thread(target=warmer.loop, daemon=True).start()
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -259,6 +259,8 @@ else
     print_info "请在宝塔面板中配置反向代理:"
     echo "  目标URL: http://127.0.0.1:${APP_PORT}"
     echo "  发送域名: \$host"
+    print_info "如需由 nginx 直接发送下载文件，在 .env 中设置 DOWNLOAD_ACCEL=nginx 并在站点配置中添加:"
+    echo "  location /protected-files/ { internal; alias ${APP_DIR}/files/; }"
 fi
 
 echo ""
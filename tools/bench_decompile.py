@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+反编译核心基准测试
+
+用 mock_codemao 的确定性作品生成器构造大型 Kitten 作品，比较串行与多进程角色反编译的
+耗时，并校验两种模式输出一致（随机生成的ID按出现顺序归一化后比较）。
+--memory 额外用 tracemalloc 统计反编译阶段的内存峰值（会拖慢运行，单独统计）。
+--actor-cache N 模拟作品更新：先完整反编译一次填充角色缓存，再修改 N 个角色后重新反编译，
+与不使用缓存的耗时和输出比较。
+--proc-actors N 让 N 个角色重复定义同名函数，校验各模式下函数调用都指向与串行无缓存反编译相同的定义。
+
+用法:
+  python tools/bench_decompile.py --actors 400 --blocks 300 --workers 0,2,4
+  python tools/bench_decompile.py --actors 200 --blocks 500 --workers 0 --memory
+  python tools/bench_decompile.py --actors 300 --blocks 200 --workers 0 --actor-cache 5
+  python tools/bench_decompile.py --actors 60 --blocks 100 --workers 0,2 --proc-actors 3 --actor-cache 2
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('UPLOAD_FOLDER', os.path.join(tempfile.gettempdir(), 'decompiler-bench-files'))
+os.environ.setdefault('PROFILE_FOLDER', os.path.join(tempfile.gettempdir(), 'decompiler-bench-profiles'))
+os.environ.setdefault('ACTOR_CACHE_FOLDER', tempfile.mkdtemp(prefix='decompiler-bench-actors-'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mock_codemao  # noqa: E402
+import app as decompiler_app  # noqa: E402
+
+ID_RE = re.compile(r'\b[0-9a-zA-Z]{20}\b')
+
+
+def normalize(text, known):
+    ids = {}
+    return ID_RE.sub(lambda m: m.group(0) if m.group(0) in known else ids.setdefault(m.group(0), f"<rand{len(ids)}>"), text)
+
+
+def run(payload, info, workers):
+    work = json.loads(payload); t0 = time.perf_counter()
+    out = decompiler_app.KittenDecompiler(info, work, workers=workers).start()
+    return time.perf_counter() - t0, json.dumps(out, ensure_ascii=False, indent=2, default=decompiler_app.json_default)
+
+
+def peak_memory(payload, info):
+    work = json.loads(payload); tracemalloc.start()
+    try: decompiler_app.KittenDecompiler(info, work, workers=0).start(); return tracemalloc.get_traced_memory()[1]
+    finally: tracemalloc.stop()
+
+
+def changed_payload(payload, n):
+    """修改第 1..n 个角色（跳过舞台）第一个脚本头部积木的参数，模拟作品发布新版本；
+    重复定义函数时被修改的角色位于两个定义者之间，会用到之前定义的版本"""
+    work = json.loads(payload)
+    for a in work["compile_result"][1:n + 1]:
+        next(iter(a["compiled_block_map"].values())).setdefault("params", {})["MODE"] = "changed"
+    return json.dumps(work, ensure_ascii=False).encode('utf-8')
+
+
+def actor_cache_bench(payload, info, changed, known, repeat):
+    cache = decompiler_app.actor_cache; cfg = decompiler_app.app.config
+    new = changed_payload(payload, changed); cache.max_bytes = 0
+    full, expected = min(run(new, info, 0) for _ in range(repeat))
+    cache.max_bytes = 4 * 1024 ** 3; run(payload, info, 0)  # 旧版本填充缓存
+    before = decompiler_app.metrics.snapshot(); t, out = run(new, info, 0); after = decompiler_app.metrics.snapshot()
+    d = {k: after.get(k, 0) - before.get(k, 0) for k in ('actor_cache_hit', 'actor_cache_miss', 'actor_cache_saved_ms')}
+    print(f"修改 {changed} 个角色后重新反编译: 无缓存 {full * 1000:8.1f} ms  有缓存 {t * 1000:8.1f} ms  加速比 {full / t:4.2f}x  "
+          f"命中 {d['actor_cache_hit']} / 未命中 {d['actor_cache_miss']}  节省 {d['actor_cache_saved_ms']} ms  输出{'一致' if normalize(out, known) == normalize(expected, known) else '不一致!'}")
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='反编译核心基准测试')
+    p.add_argument('--actors', type=int, default=300)
+    p.add_argument('--blocks', type=int, default=200, help='每个角色的积木数')
+    p.add_argument('--workers', default='0,2,4', help='逗号分隔的进程数，0 表示串行')
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--proc-actors', type=int, default=1, help='定义同名函数的角色数')
+    p.add_argument('--memory', action='store_true', help='统计串行反编译的内存峰值')
+    p.add_argument('--actor-cache', type=int, default=None, metavar='N', help='修改 N 个角色后比较有无角色缓存的耗时')
+    a = p.parse_args()
+    mock_codemao.CONF.update(actors=a.actors, blocks=a.blocks, proc_actors=a.proc_actors)
+    payload = mock_codemao.kitten_payload(1); known = set(ID_RE.findall(payload.decode('utf-8')))
+    info = {"id": 1, "name": "bench", "type": "KITTEN4", "version": "", "author_id": 0, "author_name": ""}
+    decompiler_app.app.config['PARALLEL_ACTOR_MIN'] = 1
+    print(f"作品: {a.actors} 个角色 × {a.blocks} 积木，编译文件 {len(payload) / 1024 / 1024:.1f} MiB")
+    baseline, serial_time = None, None
+    for w in (int(x) for x in a.workers.split(',')):
+        best, out = min(run(payload, info, w) for _ in range(a.repeat))
+        out = normalize(out, known); baseline = baseline or out; serial_time = serial_time or best
+        print(f"workers={w:<3} 最佳耗时 {best * 1000:8.1f} ms  {a.actors * a.blocks / best:10.0f} 积木/秒  加速比 {serial_time / best:4.2f}x  输出{'一致' if out == baseline else '不一致!'}")
+    if a.memory: print(f"串行反编译内存峰值 {peak_memory(payload, info) / 1024 / 1024:.1f} MiB")
+    if a.actor_cache is not None: actor_cache_bench(payload, info, a.actor_cache, known, a.repeat)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON 后端基准测试
+
+用 mock_codemao 生成的作品比较标准库与 orjson（需已安装）在三处的耗时：
+解析编译文件、写出反编译结果（indent=2）、序列化 API 响应，并校验两者输出逐字节一致。
+
+用法:
+  python tools/bench_json.py --actors 200 --blocks 200
+  python tools/bench_json.py --coco --widgets 5000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('UPLOAD_FOLDER', os.path.join(tempfile.gettempdir(), 'decompiler-bench-files'))
+os.environ.setdefault('PROFILE_FOLDER', os.path.join(tempfile.gettempdir(), 'decompiler-bench-profiles'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mock_codemao  # noqa: E402
+import app as decompiler_app  # noqa: E402
+
+
+def best(fn, repeat):
+    ts = []
+    for _ in range(repeat): t0 = time.perf_counter(); r = fn(); ts.append(time.perf_counter() - t0)
+    return min(ts), r
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='JSON 后端基准测试')
+    p.add_argument('--actors', type=int, default=200)
+    p.add_argument('--blocks', type=int, default=200, help='每个角色的积木数')
+    p.add_argument('--coco', action='store_true', help='使用 CoCo 作品')
+    p.add_argument('--widgets', type=int, default=2000, help='CoCo 作品控件数')
+    p.add_argument('--repeat', type=int, default=5)
+    a = p.parse_args()
+    if decompiler_app.orjson is None: sys.exit("未安装 orjson（pip install orjson），无法比较")
+    mock_codemao.CONF.update(actors=a.actors, blocks=a.blocks, widgets=a.widgets)
+    payload = mock_codemao.coco_payload(1) if a.coco else mock_codemao.kitten_payload(1)
+    info = {"id": 1, "name": "基准测试", "type": "COCO" if a.coco else "KITTEN4", "version": "", "author_id": 0, "author_name": "压测"}
+    cfg = decompiler_app.app.config; cfg['JSON_BACKEND'] = 'stdlib'
+    work = decompiler_app.json_loads(payload)
+    out = (decompiler_app.CoCoDecompiler(info, work) if a.coco else decompiler_app.KittenDecompiler(info, work, workers=0)).start()
+    resp = {'success': True, 'data': {'records': [{'id': i, 'work_id': i, 'work_name': f'作品{i}', 'work_type': 'KITTEN4', 'author_name': '作者', 'file_size': 1024, 'status': 'success', 'created_at': '2024-01-01T00:00:00', 'expires_at': None, 'download_count': 0} for i in range(100)], 'total': 100, 'page': 1, 'per_page': 100, 'pages': 1}}
+    tasks = [
+        ('解析编译文件', lambda: decompiler_app.json_loads(payload), None),
+        ('写出反编译结果', lambda: decompiler_app.json_dumps_bytes(out, ensure_ascii=False, indent=2, default=decompiler_app.json_default), len),
+        ('API 响应 x100', lambda: [decompiler_app.app.json.response(resp).get_data() for _ in range(100)][-1], len),
+    ]
+    print(f"编译文件 {len(payload) / 1024 / 1024:.1f} MiB，orjson {decompiler_app.orjson.__version__}")
+    print(f"{'阶段':<14}{'stdlib(ms)':>12}{'orjson(ms)':>12}{'加速比':>8}  输出")
+    with decompiler_app.app.app_context():
+        for name, fn, size in tasks:
+            results = {}
+            for backend in ('stdlib', 'orjson'):
+                cfg['JSON_BACKEND'] = backend; results[backend] = best(fn, a.repeat)
+            (ts, rs), (to, ro) = results['stdlib'], results['orjson']
+            same = rs == ro
+            print(f"{name:<14}{ts * 1000:>12.1f}{to * 1000:>12.1f}{ts / to:>8.2f}x  {'一致' if same else '不一致!'}{f' ({size(rs) / 1024 / 1024:.1f} MiB)' if size and size(rs) > 1024 * 1024 else ''}")
+    print(f"json_fallback: {decompiler_app.metrics.snapshot().get('json_fallback', 0)}")
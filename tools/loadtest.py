@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+反编译服务压测工具
+
+并发调用 /api/decompile，并按比例下载结果 /api/download/<rid>，
+输出吞吐量、p50/p95/p99 延迟和错误率。
+
+用法:
+  python tools/mock_codemao.py --port 8001 --latency-ms 80 &
+  CODEMAO_API_BASE=http://127.0.0.1:8001 CODEMAO_CREATION_BASE=http://127.0.0.1:8001 \\
+      gunicorn -w 4 --threads 2 -b 127.0.0.1:5000 --timeout 120 app:app &
+  python tools/loadtest.py --target http://127.0.0.1:5000 -c 16 -n 500 --wid-range 1-200
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+
+import requests
+
+
+def percentile(values, p):
+    if not values: return 0.0
+    s = sorted(values); k = max(0, min(len(s) - 1, math.ceil(p / 100 * len(s)) - 1))
+    return s[k]
+
+
+class LoadTest:
+    def __init__(self, target, concurrency, total, duration, wid_min, wid_max, download_ratio, timeout):
+        self.target, self.concurrency, self.total, self.duration = target.rstrip('/'), concurrency, total, duration
+        self.wid_min, self.wid_max, self.download_ratio, self.timeout = wid_min, wid_max, download_ratio, timeout
+        self.lat, self.status, self.lock, self.sent = defaultdict(list), defaultdict(Counter), threading.Lock(), 0
+
+    def _next(self):
+        with self.lock:
+            if self.total and self.sent >= self.total: return False
+            if self.duration and time.time() - self.started >= self.duration: return False
+            self.sent += 1; return True
+
+    def _record(self, op, t0, status):
+        with self.lock: self.lat[op].append((time.perf_counter() - t0) * 1000); self.status[op][status] += 1
+
+    def _worker(self):
+        s = requests.Session()
+        while self._next():
+            t0 = time.perf_counter()
+            try:
+                r = s.post(f"{self.target}/api/decompile", json={'work_id': random.randint(self.wid_min, self.wid_max)}, timeout=self.timeout)
+                self._record('decompile', t0, r.status_code); d = r.json() if r.headers.get('Content-Type', '').startswith('application/json') else {}
+            except requests.RequestException as e: self._record('decompile', t0, type(e).__name__); continue
+            if d.get('success') and random.random() < self.download_ratio:
+                t0 = time.perf_counter()
+                try:
+                    r = s.get(f"{self.target}{d['data']['download_url']}", timeout=self.timeout); r.content; self._record('download', t0, r.status_code)
+                except requests.RequestException as e: self._record('download', t0, type(e).__name__)
+
+    def run(self):
+        self.started = time.time()
+        ts = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.concurrency)]
+        [t.start() for t in ts]; [t.join() for t in ts]
+        self.elapsed = time.time() - self.started
+        return self.report()
+
+    def report(self):
+        out = {'elapsed_s': round(self.elapsed, 2), 'concurrency': self.concurrency, 'ops': {}}
+        for op, lat in self.lat.items():
+            st = self.status[op]; n = sum(st.values()); ok = sum(c for k, c in st.items() if isinstance(k, int) and k < 400)
+            out['ops'][op] = {'requests': n, 'throughput_rps': round(n / self.elapsed, 2) if self.elapsed else 0, 'p50_ms': round(percentile(lat, 50), 1), 'p95_ms': round(percentile(lat, 95), 1), 'p99_ms': round(percentile(lat, 99), 1), 'max_ms': round(max(lat), 1), 'error_rate': round(1 - ok / n, 4) if n else 0, 'status': {str(k): v for k, v in st.items()}}
+        return out
+
+
+def print_report(rep):
+    print(f"耗时 {rep['elapsed_s']}s，并发 {rep['concurrency']}")
+    print(f"{'接口':<10}{'请求数':>8}{'吞吐/s':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'错误率':>9}  状态码")
+    for op, r in rep['ops'].items():
+        print(f"{op:<10}{r['requests']:>8}{r['throughput_rps']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['error_rate']:>9.2%}  {r['status']}")
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='反编译服务压测工具')
+    p.add_argument('--target', default='http://127.0.0.1:5000')
+    p.add_argument('-c', '--concurrency', type=int, default=8)
+    p.add_argument('-n', '--requests', type=int, default=200, help='反编译请求总数 (0 表示按 --duration)')
+    p.add_argument('-d', '--duration', type=float, default=0, help='持续秒数')
+    p.add_argument('--wid-range', default='1-1000', help='随机作品ID范围，如 1-1000')
+    p.add_argument('--download-ratio', type=float, default=1.0, help='成功后下载文件的比例')
+    p.add_argument('--timeout', type=float, default=130)
+    p.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    a = p.parse_args()
+    lo, hi = (int(x) for x in a.wid_range.split('-'))
+    rep = LoadTest(a.target, a.concurrency, a.requests, a.duration, lo, hi, a.download_ratio, a.timeout).run()
+    print(json.dumps(rep, ensure_ascii=False, indent=2)) if a.json else print_report(rep)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+编程猫上游接口模拟服务 - 用于本地压测
+
+实现 CodemaoAPI / Decompiler.decompile 用到的接口：
+  GET /creation-tools/v1/works/<wid>              作品信息
+  GET /kitten/r2/work/player/load/<wid>           Kitten 编译文件地址
+  GET /coconut/web/work/<wid>/load                CoCo 编译文件地址
+  GET /cdn/<kind>/<wid>                           编译文件本体
+
+作品类型、大小由作品ID确定性生成，同一ID每次返回相同内容；
+作品信息和编译文件带 ETag，支持 If-None-Match 条件请求（返回 304）。
+
+用法:
+  python tools/mock_codemao.py --port 8001 --latency-ms 80 --error-rate 0.01 --actors 20 --blocks 200
+  CODEMAO_API_BASE=http://127.0.0.1:8001 CODEMAO_CREATION_BASE=http://127.0.0.1:8001 gunicorn -w 4 --threads 2 app:app
+"""
+
+import argparse
+import json
+import random
+import time
+from functools import lru_cache
+
+from flask import Flask, Response, abort, jsonify, request
+
+app = Flask(__name__)
+CONF = {'latency_ms': 0.0, 'jitter_ms': 0.0, 'cdn_latency_ms': 0.0, 'error_rate': 0.0, 'missing_rate': 0.0, 'coco_rate': 0.1, 'actors': 10, 'blocks': 100, 'procedures': 3, 'proc_actors': 1, 'widgets': 50, 'screens': 3}
+
+STATEMENTS = ["self_move_forward", "self_rotate", "self_say", "self_wait", "pen_down", "play_audio"]
+VALUES = ["math_number", "text", "get_current_costume", "lists_get"]
+
+
+def rng_for(wid, salt=""): return random.Random(f"{wid}:{salt}")
+
+def work_type(wid):
+    r = rng_for(wid, "type")
+    if r.random() < CONF['missing_rate']: return None
+    return "COCO" if r.random() < CONF['coco_rate'] else r.choice(["KITTEN4", "KITTEN4", "KITTEN3"])
+
+def bid(r): return ''.join(r.choice('0123456789abcdefghijklmnopqrstuvwxyz') for _ in range(20))
+
+
+def make_value(r):
+    t = r.choice(VALUES)
+    return {"id": bid(r), "kind": "domain_block", "type": t, "params": {"NUM" if t == "math_number" else "TEXT": str(r.randint(0, 999))}}
+
+def make_statement(r, procs, depth=0):
+    roll = r.random()
+    if roll < 0.1 and depth < 3:
+        n = r.randint(1, 3)
+        return {"id": bid(r), "kind": "domain_block", "type": "controls_if" if n > 1 else "controls_if_no_else", "conditions": [{"id": bid(r), "kind": "domain_block", "type": "logic_boolean", "params": {"BOOL": "TRUE"}} for _ in range(n)], "child_block": [make_statement(r, procs, depth + 1) for _ in range(n)] + [None]}
+    if roll < 0.2 and procs:
+        return {"id": bid(r), "kind": "domain_block", "type": "procedures_2_callnoreturn", "procedure_name": r.choice(procs), "params": {"x": make_value(r)}}
+    return {"id": bid(r), "kind": "domain_block", "type": r.choice(STATEMENTS), "params": {"VALUE": make_value(r), "MODE": "default"}}
+
+def make_script(r, procs, n):
+    head = {"id": bid(r), "kind": "event_block", "type": "on_running_group_activated"}; cur = head
+    for _ in range(n): cur["next_block"] = make_statement(r, procs); cur = cur["next_block"]
+    return head
+
+
+@lru_cache(maxsize=256)
+def kitten_payload(wid):
+    r = rng_for(wid, "payload"); actors, theatre = [], {"actors": {}, "scenes": {}}
+    procs = [f"proc_{i}" for i in range(CONF['procedures'])]
+    step = max(CONF['actors'] // max(CONF['proc_actors'], 1), 1)  # 定义同名函数的角色均匀分布，后定义的覆盖先定义的
+    for i in range(CONF['actors']):
+        aid = bid(r); theatre["scenes" if i == 0 else "actors"][aid] = {"id": aid, "name": f"角色{i}"}
+        defs = {p: {"id": bid(r), "kind": "domain_block", "type": "procedures_2_defnoreturn", "procedure_name": p, "params": {"x": ""}, "child_block": [make_statement(r, [])]} for p in procs} if i % step == 0 and i // step < CONF['proc_actors'] else {}
+        blocks, left = {}, CONF['blocks']
+        while left > 0:
+            n = min(left, r.randint(5, 20)); s = make_script(r, procs, n); blocks[s["id"]] = s; left -= n
+        actors.append({"id": aid, "compiled_block_map": blocks, "procedures": defs})
+    return json.dumps({"compile_result": actors, "theatre": theatre, "preview": "", "author_nickname": "压测"}, ensure_ascii=False).encode('utf-8')
+
+@lru_cache(maxsize=256)
+def coco_payload(wid):
+    r = rng_for(wid, "payload")
+    widgets = {bid(r): {"id": "", "type": "BUTTON", "title": f"按钮{i}"} for i in range(CONF['widgets'])}
+    ids = list(widgets); screens = []
+    for i in range(CONF['screens']):
+        part = ids[i::CONF['screens']]
+        screens.append({"id": bid(r), "title": f"屏幕{i}", "widgetIds": part[1:], "invisibleWidgetIds": part[:1]})
+    blocks = {s["id"]: {"blocks": {"languageVersion": 0, "blocks": []}} for s in screens}
+    return json.dumps({"id": wid, "screenList": screens, "widgetMap": widgets, "blockJsonMap": blocks, "imageFileMap": {"a": {"id": "a"}}, "soundFileMap": {}, "iconFileMap": {}, "fontFileMap": {}, "variableMap": {}, "gridMap": {}}, ensure_ascii=False).encode('utf-8')
+
+
+def simulate(latency_ms):
+    d = max(0.0, latency_ms + random.uniform(-CONF['jitter_ms'], CONF['jitter_ms']))
+    if d: time.sleep(d / 1000)
+    if random.random() < CONF['error_rate']: abort(502)
+
+def base(): return request.host_url.rstrip('/')
+
+
+@app.route('/creation-tools/v1/works/<int:wid>')
+def work_info(wid):
+    simulate(CONF['latency_ms']); wt = work_type(wid)
+    if not wt: return jsonify({"error_code": "Not-Found"}), 404
+    r = jsonify({"id": wid, "work_name": f"压测作品{wid}", "type": wt, "bcm_version": "0.16.2", "user_info": {"id": wid % 9973, "nickname": "压测用户"}})
+    r.add_etag(); return r.make_conditional(request)
+
+@app.route('/kitten/r2/work/player/load/<int:wid>')
+def kitten_load(wid):
+    simulate(CONF['latency_ms'])
+    return jsonify({"source_urls": [f"{base()}/cdn/kitten/{wid}"]})
+
+@app.route('/coconut/web/work/<int:wid>/load')
+def coco_load(wid):
+    simulate(CONF['latency_ms'])
+    return jsonify({"data": {"bcmc_url": f"{base()}/cdn/coco/{wid}"}})
+
+@app.route('/cdn/<kind>/<int:wid>')
+def cdn(kind, wid):
+    simulate(CONF['cdn_latency_ms'])
+    if kind not in ("kitten", "coco"): abort(404)
+    r = Response(kitten_payload(wid) if kind == "kitten" else coco_payload(wid), mimetype='application/json')
+    r.add_etag(); return r.make_conditional(request)
+
+
+if __name__ == '__main__':
+    p = argparse.ArgumentParser(description='编程猫上游接口模拟服务')
+    p.add_argument('--host', default='127.0.0.1'); p.add_argument('--port', type=int, default=8001)
+    p.add_argument('--latency-ms', type=float, default=0, help='接口平均延迟')
+    p.add_argument('--jitter-ms', type=float, default=0, help='延迟抖动范围 (±)')
+    p.add_argument('--cdn-latency-ms', type=float, default=None, help='编译文件下载延迟 (默认同 --latency-ms)')
+    p.add_argument('--error-rate', type=float, default=0, help='返回 502 的比例')
+    p.add_argument('--missing-rate', type=float, default=0, help='作品不存在的比例')
+    p.add_argument('--coco-rate', type=float, default=0.1, help='CoCo 作品的比例')
+    p.add_argument('--actors', type=int, default=10, help='Kitten 作品角色数')
+    p.add_argument('--blocks', type=int, default=100, help='每个角色的积木数')
+    p.add_argument('--procedures', type=int, default=3, help='自定义函数数量')
+    p.add_argument('--proc-actors', type=int, default=1, help='定义这些函数的角色数（大于 1 时同名函数被多个角色重复定义）')
+    p.add_argument('--widgets', type=int, default=50, help='CoCo 作品控件数')
+    p.add_argument('--screens', type=int, default=3, help='CoCo 作品屏幕数')
+    a = p.parse_args()
+    CONF.update({k: v for k, v in vars(a).items() if k in CONF})
+    CONF['cdn_latency_ms'] = a.latency_ms if a.cdn_latency_ms is None else a.cdn_latency_ms
+    app.run(host=a.host, port=a.port, threaded=True)